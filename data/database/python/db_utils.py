@@ -1,6 +1,26 @@
 import os
+import json
+import tempfile
+import importlib.util
 from dotenv import load_dotenv
-import mysql.connector
+import numpy as np
+import pandas as pd
+
+# Moteur de lecture CSV : pyarrow (parsing C++ multithread) s'il est installé,
+# sinon le parseur C par défaut de pandas.
+CSV_ENGINE = "pyarrow" if importlib.util.find_spec("pyarrow") else "c"
+
+# Moteur de lecture Excel : calamine (parseur Rust en streaming) s'il est
+# installé, sinon openpyxl (moteur par défaut de pandas).
+EXCEL_ENGINE = "calamine" if importlib.util.find_spec("python_calamine") else None
+
+# Sérialisation JSON : orjson (écrit directement depuis le buffer NumPy)
+# s'il est installé, sinon json standard via tolist().
+if importlib.util.find_spec("orjson"):
+    import orjson
+else:
+    orjson = None
+
 
 def get_db_connection():
     """
@@ -13,10 +33,12 @@ def get_db_connection():
         DB_PASSWORD=
         DB_NAME=
         DB_PORT=
+        DB_LOCAL_INFILE=1   (optionnel, active LOAD DATA LOCAL INFILE)
 
     Cette fonction retourne :
         - conn  : objet connexion MySQL
-        - cursor : curseur simple (tuple-based)
+        - cursor : curseur simple (tuple-based) ; executemany() y regroupe
+          les lignes en INSERT multi-VALUES
     """
 
     # Charge les variables définies dans .env
@@ -32,26 +54,160 @@ def get_db_connection():
     db_name = os.getenv('DB_NAME')
     db_port = os.getenv('DB_PORT')
 
-    # Connexion MySQL standard (mysql-connector)
+    # Connexion MySQL standard (mysql-connector : extension C si elle est
+    # installée, client pur Python sinon — comportement par défaut)
+    # Import différé : PyMySQL / mysql-connector ne sont chargés que par
+    # la fonction de connexion réellement appelée.
+    import mysql.connector
+
     conn = mysql.connector.connect(
         host=db_host,
         user=db_user,
         password=db_password,
         port=db_port,
-        database=db_name
+        database=db_name,
+        allow_local_infile=local_infile_enabled()
     )
     cursor = conn.cursor()
     return conn, cursor
 
 
-# Variante : connexion via PyMySQL avec curseur dict
-import pymysql
+def insert_many(cursor, query, rows, chunk_size=10000):
+    """
+    Insère une liste de tuples en lots via cursor.executemany().
+
+    mysql-connector regroupe chaque lot en un seul INSERT multi-VALUES :
+    un aller-retour réseau par lot au lieu d'un par ligne.
+    Le découpage en lots de `chunk_size` lignes évite de dépasser
+    `max_allowed_packet` côté serveur.
+    """
+    for start in range(0, len(rows), chunk_size):
+        cursor.executemany(query, rows[start:start + chunk_size])
+
+
+def local_infile_enabled():
+    """
+    Indique si le chargement par LOAD DATA LOCAL INFILE est activé
+    (DB_LOCAL_INFILE=1 dans le .env ; le serveur doit aussi avoir local_infile=1).
+    """
+    return os.getenv('DB_LOCAL_INFILE') == '1'
+
+
+def _tsv_field(value):
+    """Formate une valeur pour LOAD DATA (NULL → \\N, échappements MySQL)."""
+    if value is None:
+        return '\\N'
+    return (
+        str(value)
+        .replace('\\', '\\\\')
+        .replace('\t', '\\t')
+        .replace('\n', '\\n')
+    )
+
+
+def load_data_infile(cursor, table, columns, rows):
+    """
+    Charge une liste de tuples via LOAD DATA LOCAL INFILE.
+
+    Les lignes sont écrites dans un fichier TSV temporaire, puis lues
+    directement par le chargeur en masse de MySQL (pas de parsing SQL
+    ligne par ligne). Le fichier est supprimé après chargement.
+    """
+    with tempfile.NamedTemporaryFile(
+        'w', suffix='.tsv', encoding='utf-8', newline='', delete=False
+    ) as f:
+        for row in rows:
+            f.write('\t'.join(_tsv_field(v) for v in row))
+            f.write('\n')
+        tsv_path = f.name
+
+    try:
+        cursor.execute(
+            f"LOAD DATA LOCAL INFILE %s INTO TABLE {table} "
+            "CHARACTER SET utf8mb4 "
+            "FIELDS TERMINATED BY '\\t' LINES TERMINATED BY '\\n' "
+            f"({', '.join(columns)})",
+            (tsv_path,)
+        )
+    finally:
+        os.remove(tsv_path)
+
+
+def read_trial_csv(path, usecols):
+    """
+    Lit un fichier CSV d'un trial VR (cars.csv, peds.csv, séparateur ';').
 
+    Seules les colonnes `usecols` sont parsées : les autres colonnes
+    des fichiers bruts ne sont jamais converties.
+    """
+    return pd.read_csv(path, sep=';', usecols=usecols, engine=CSV_ENGINE)
+
+
+def read_plan_excel(path, usecols):
+    """
+    Lit un plan d'expérience participant (*_exp1.xlsx / *_exp2.xlsx, 27 lignes).
+
+    Seules les colonnes `usecols` sont chargées.
+    """
+    return pd.read_excel(path, usecols=usecols, engine=EXCEL_ENGINE)
+
+
+def dumps_array(arr):
+    """
+    Sérialise un tableau NumPy 1D en JSON compact (colonnes JSON MySQL).
+
+    Avec orjson, les flottants sont écrits depuis le buffer NumPy sans
+    passer par une liste Python intermédiaire, après réduction en float32
+    (précision largement suffisante au cm près) : orjson écrit le décimal
+    le plus court de chaque float32, d'où un JSON ~2× plus court.
+    Le repli json standard garde float64 : un float32 y serait écrit avec
+    son bruit binaire (-12.345678 → -12.345678329467773), donc plus long.
+    """
+    if orjson is not None:
+        if arr.dtype.kind == 'f':
+            arr = arr.astype(np.float32)
+        return orjson.dumps(arr, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+    return json.dumps(arr.tolist(), separators=(',', ':'))
+
+
+def begin_bulk_load(conn, cursor):
+    """
+    Prépare la session MySQL pour un chargement massif.
+
+    - autocommit désactivé : le DELETE des anciennes lignes et toutes les
+      insertions tiennent dans UNE transaction (un seul flush du redo log /
+      binlog au COMMIT final). En cas d'erreur, conn.rollback() restaure
+      la table telle qu'avant l'import (pas de TRUNCATE : il valide
+      implicitement et ne s'annule pas).
+    - unique_checks / foreign_key_checks désactivés pendant le chargement :
+      les données proviennent de nos propres fichiers, déjà cohérents.
+
+    À appeler juste après get_db_connection(), avant le DELETE
+    (foreign_key_checks=0 est requis pour vider Participant, référencée
+    par Perception et Crossing).
+    """
+    conn.autocommit = False  # envoie SET autocommit=0 au serveur
+    cursor.execute("SET unique_checks=0")
+    cursor.execute("SET foreign_key_checks=0")
+
+
+def end_bulk_load(conn, cursor):
+    """
+    Valide la transaction ouverte par begin_bulk_load() (COMMIT unique)
+    puis rétablit les contrôles d'intégrité de la session.
+    """
+    conn.commit()
+    cursor.execute("SET unique_checks=1")
+    cursor.execute("SET foreign_key_checks=1")
+
+
+# Variante : connexion via PyMySQL avec curseur dict
 def get_py_db_connection():
     """
     Variante de connexion utilisant PyMySQL.
     Retourne un curseur dict (clé → valeur), utile pour les requêtes plus structurées.
     """
+    import pymysql
 
     conn = pymysql.connect(
         host=os.getenv('DB_HOST'),
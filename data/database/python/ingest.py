@@ -0,0 +1,414 @@
+import os
+import glob
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from tqdm import tqdm
+from kernels import analyze_trial
+from db_utils import get_db_connection, insert_many, begin_bulk_load, end_bulk_load, read_trial_csv, read_plan_excel, dumps_array, local_infile_enabled, load_data_infile
+
+# ------------------------------------------------------------
+# Pipeline d'import commun exp1 (Perception) + exp2 (Crossing)
+#
+# Un seul parcours de data/raw/ : pour chaque participant, les plans
+# *_exp1.xlsx / *_exp2.xlsx et les trials exp1/ et exp2/ sont lus une
+# fois, puis les deux tables sont chargées dans une transaction unique.
+# ------------------------------------------------------------
+
+# ------------------------------------------------------------
+# Détection automatique du chemin racine du repository
+# Le script se trouve dans : pedestrian-crossing-prediction/data/mysql_scripts/
+# On remonte de 2 niveaux → pedestrian-crossing-prediction/
+# ------------------------------------------------------------
+repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Dossier contenant les données VR brutes :
+# pedestrian-crossing-prediction/data/raw/
+base_path = os.path.join(repo_root, "data", "raw")
+
+# Requêtes d'insertion (exécutées en lots à la fin du parcours)
+INSERT_PERCEPTION = """
+    INSERT INTO Perception (participant_id, perceived_distance, weather_id, velocity_id, distance_id)
+    VALUES (%s, %s, %s, %s, %s)
+"""
+
+INSERT_CROSSING = """
+    INSERT INTO Crossing (
+        participant_id, weather_id, position_id, velocity_id,
+        distance_car_ped, crossing_value, safety_distance
+    )
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
+"""
+
+# Colonnes dans l'ordre des tuples (chargement LOAD DATA)
+PERCEPTION_COLUMNS = (
+    'participant_id', 'perceived_distance', 'weather_id', 'velocity_id', 'distance_id',
+)
+
+CROSSING_COLUMNS = (
+    'participant_id', 'weather_id', 'position_id', 'velocity_id',
+    'distance_car_ped', 'crossing_value', 'safety_distance',
+)
+
+
+# ------------------------------------------------------------
+# Parcours du système de fichiers
+# ------------------------------------------------------------
+def list_participants(base_path):
+    """
+    Liste les dossiers participants (format XXX_24, XXX_03, ...).
+
+    Chaque participant réel est un dossier commençant par "XXX"
+    (scandir : type de l'entrée connu sans stat supplémentaire).
+    """
+    with os.scandir(base_path) as it:
+        return [e.name for e in it if e.is_dir() and e.name.startswith("XXX")]
+
+
+def list_trials(folder_path):
+    """
+    Liste les trials d'un dossier exp1/ ou exp2/ (sous-dossiers 1..27).
+
+    Retourne des couples (chemin du trial, indice 0..26), triés
+    numériquement : ordre déterministe, int() parsé une seule fois.
+    """
+    subfolders = sorted(os.listdir(folder_path), key=int)
+    return [(os.path.join(folder_path, sub), int(sub) - 1) for sub in subfolders]
+
+
+# ------------------------------------------------------------
+# Traitement d'un trial (exécuté dans un processus du pool)
+# ------------------------------------------------------------
+def process_perception_trial(args):
+    """
+    Calcule la distance perçue d'un trial exp1 (cars.csv).
+
+    Paramètre :
+        - args : tuple (csv_path, idx, velocity)
+            csv_path : dossier du trial (exp1/<n>/)
+            idx      : indice du trial dans le plan (0..26)
+            velocity : vitesse réelle du trial (km/h)
+
+    Basé sur :
+        - t1 = moment où X_pos devient 0 après disparition du véhicule
+        - t2 = moment où Time_estimated devient non nul
+        - v  = vitesse réelle du trial
+        - d  = v * (t2 - t1)
+
+    Retourne (idx, d) ; si valeurs introuvables → d = None.
+    """
+    csv_path, idx, velocity = args
+
+    # Chargement des données véhicule du trial
+    cars = read_trial_csv(os.path.join(csv_path, "cars.csv"), ['Time', 'X_pos', 'Time_estimated'])
+
+    try:
+        # Moment disparition visuelle du véhicule (X_pos == 0)
+        t1 = cars[cars['X_pos'] == 0]['Time'].iloc[1]
+
+        # Moment où participant pense que la voiture arrive (first non-zero)
+        t2_series = cars[cars['Time_estimated'] != 0]['Time']
+
+        if t2_series.empty:
+            return idx, None
+
+        t2 = t2_series.iloc[0]
+        delta_t = t2 - t1
+        v = velocity / 3.6  # conversion km/h → m/s
+        return idx, v * delta_t
+
+    # Problème si index introuvable (ex : pas assez de lignes)
+    except (IndexError, ValueError):
+        return idx, None
+
+
+def process_crossing_trial(args):
+    """
+    Lit et analyse un trial exp2 (cars.csv + peds.csv).
+
+    Paramètre :
+        - args : tuple (csv_path, idx, pos_ref)
+            csv_path : dossier du trial (exp2/<n>/)
+            idx      : indice du trial dans le plan (0..26)
+            pos_ref  : position X du piéton (cm)
+
+    Retourne (idx, distances, crossing, safety_distance).
+    Aucune connexion MySQL ici : seul le processus principal écrit en base.
+    """
+    csv_path, idx, pos_ref = args
+
+    # Chargement des données véhicule & piéton
+    # (seules les colonnes utiles sont parsées)
+    cars = read_trial_csv(os.path.join(csv_path, "cars.csv"), ['Time', 'X_pos'])
+    peds = read_trial_csv(os.path.join(csv_path, "peds.csv"), ['Time', 'Crossing'])
+
+    # Normalisation colonnes
+    cars = cars[['Time', 'X_pos']].rename(columns={'X_pos': 'X_cars'})
+    peds = peds[['Time', 'Crossing']]
+
+    # Synchronisation par Time : alignement sur l'index quand chaque Time
+    # de cars est unique (équivaut alors au merge inner suivi du dropna,
+    # sans jointure par hachage). Sinon, merge inner comme la version
+    # originale : chaque ligne voiture d'un Time dupliqué est conservée.
+    if cars['Time'].is_unique:
+        cars = cars.set_index('Time')
+        peds = peds.set_index('Time')
+        peds['X_cars'] = cars['X_cars']
+        peds = peds.dropna().reset_index()
+    else:
+        peds = pd.merge(peds, cars, on="Time", how="inner").dropna()
+    peds = peds[peds['X_cars'] != 0]  # voiture visible seulement
+    peds = peds.reset_index(drop=True)  # index positionnel 0..n-1
+
+    # ------------------------------------------------------------
+    # Correction du "Crossing" (positionnelle, sur le tableau NumPy) :
+    # - trouve le 1er 1
+    # - met tout avant à 1
+    # - round sur les valeurs non 0/1 (cas VR)
+    # ------------------------------------------------------------
+    c = peds['Crossing'].to_numpy(copy=True)
+    first_one = int(np.argmax(c == 1))
+    c[:first_one] = 1
+    peds['Crossing'] = np.where((c != 0) & (c != 1), np.rint(c), c)
+
+    # ------------------------------------------------------------
+    # Distance voiture → piéton (cm → mètres), transitions Cross
+    # (0 -> 1 = début, 1 -> 0 = fin) et safety distance (distance entre
+    # la fin du crossing et la position du piéton) : voir kernels.py
+    # ------------------------------------------------------------
+    crossing = peds['Crossing'].values
+    dist, safety, _, _ = analyze_trial(crossing, peds['X_cars'].values, pos_ref)
+
+    # Crossing en 0/1 entiers ; la précision des distances stockées en
+    # JSON est choisie par dumps_array (float32 avec orjson). Safety
+    # distance manquante laissée en NaN (→ NULL dans crossing_rows)
+    return idx, dist, crossing.astype(np.int8), safety
+
+
+# ------------------------------------------------------------
+# Lignes SQL d'un participant
+# ------------------------------------------------------------
+def perception_rows(participant_id, path, executor):
+    """
+    Construit les lignes Perception (27 par plan exp1) d'un participant.
+    """
+    rows = []
+
+    # ------------------------------------------------------------
+    # Recherche du fichier Excel de plan expérimental (exp1)
+    # Exemple : participant_X_commands_exp1.xlsx
+    # ------------------------------------------------------------
+    for input_path in glob.glob(os.path.join(path, "*exp1.xlsx")):
+
+        # Lecture du plan d’expérience (27 trials)
+        inputs = read_plan_excel(input_path, ['Distance (-d)', 'Velocity (-v)', 'Weather'])
+        distance_disappearance = inputs['Distance (-d)'].values
+        velocity = inputs['Velocity (-v)'].values
+        weather = inputs['Weather'].values
+
+        # Buffer où sera stockée la distance perçue
+        perceived_distance = [None for _ in range(27)]
+
+        # ------------------------------------------------------------
+        # Recherche du dossier exp1/
+        # Chaque sous-dossier 1..27 contient cars.csv, gaze.csv, peds.csv
+        # ------------------------------------------------------------
+        folder_path = os.path.join(path, "exp1")
+        if os.path.isdir(folder_path):
+            tasks = [
+                (csv_path, idx, velocity[idx])
+                for csv_path, idx in list_trials(folder_path)
+            ]
+
+            # Parcours des 27 sous-dossiers (1,2,3,...,27), en parallèle
+            results = executor.map(process_perception_trial, tasks, chunksize=4)
+            for idx, d in tqdm(
+                results, total=len(tasks), desc=f"Trials for {participant_id}", leave=True
+            ):
+                perceived_distance[idx] = d
+
+        # ------------------------------------------------------------
+        # Préparation des lignes SQL après calcul des 27 trials
+        # ------------------------------------------------------------
+        for i in range(len(perceived_distance)):
+            participant_id_sql = str(participant_id)
+            perceived_distance_sql = float(perceived_distance[i]) if perceived_distance[i] is not None else None
+            velocity_sql = float(velocity[i]) if not pd.isna(velocity[i]) else None
+            distance_sql = float(distance_disappearance[i]) if not pd.isna(distance_disappearance[i]) else None
+            weather_sql = str(weather[i]) if not pd.isna(weather[i]) else None
+
+            rows.append((
+                participant_id_sql,
+                perceived_distance_sql,
+                weather_sql,
+                velocity_sql,
+                distance_sql
+            ))
+
+    return rows
+
+
+def crossing_rows(participant_id, path, executor):
+    """
+    Construit les lignes Crossing (27 par plan exp2) d'un participant.
+    """
+    rows = []
+
+    # ------------------------------------------------------------
+    # Position du piéton dépend de la version de la scène
+    # (certains participants ont position[1]=2665, d'autres 3665)
+    # ------------------------------------------------------------
+    pos = [14343.0, 3665.0, 13317.0]   # valeurs standards
+    if int(participant_id[-2:]) > 34:  # participants tardifs → modif pos1
+        pos = [14343.0, 2665.0, 13317.0]
+
+    # ------------------------------------------------------------
+    # Recherche du plan d’expérience Exp2 (fichier Excel)
+    # ------------------------------------------------------------
+    for input_path in glob.glob(os.path.join(path, "*exp2.xlsx")):
+
+        inputs = read_plan_excel(input_path, ['Velocity (-v)', 'Position (-pos)', 'Weather'])
+
+        # Paramètres Exp2 pour chaque trial (27 lignes)
+        velocity = inputs['Velocity (-v)'].values
+        position = inputs['Position (-pos)'].values
+        weather  = inputs['Weather'].values
+
+        # Buffers de stockage
+        crossing_value = [np.array([]) for _ in range(27)]
+        distance_car_ped = [np.array([]) for _ in range(27)]
+        safety_distance_values = np.zeros(27)
+
+        # ------------------------------------------------------------
+        # Recherche du dossier exp2/ contenant 1..27
+        # ------------------------------------------------------------
+        folder_path = os.path.join(path, "exp2")
+        if os.path.isdir(folder_path):
+
+            # Arguments des trials : dossier, indice et position de
+            # référence du piéton, calculés une seule fois
+            tasks = [
+                (csv_path, idx, pos[position[idx]])
+                for csv_path, idx in list_trials(folder_path)
+            ]
+
+            # ------------------------------------------------------------
+            # Parcours des 27 trials (en parallèle)
+            # ------------------------------------------------------------
+            results = executor.map(process_crossing_trial, tasks, chunksize=4)
+            for idx, dist, crossing, safety_distance in tqdm(
+                results, total=len(tasks), desc="Trial", leave=True
+            ):
+                distance_car_ped[idx] = dist
+                crossing_value[idx]   = crossing
+                safety_distance_values[idx] = safety_distance
+
+        # ------------------------------------------------------------
+        # Préparation des lignes SQL pour les 27 trials
+        # ------------------------------------------------------------
+        for i in range(27):
+            crossing_value_json = dumps_array(crossing_value[i])
+            distance_car_ped_json = dumps_array(distance_car_ped[i])
+
+            position_val = int(position[i]) if position[i] is not None else None
+            velocity_val = float(velocity[i]) if velocity[i] is not None else None
+            weather_val = weather[i] if weather[i] is not None else None
+            # Safety distance manquante (NaN) → None (NULL côté MySQL,
+            # \N dans le fichier LOAD DATA)
+            safety_distance_val = (
+                None
+                if np.isnan(safety_distance_values[i])
+                else float(safety_distance_values[i])
+            )
+
+            rows.append((
+                participant_id,
+                weather_val,
+                position_val,
+                velocity_val,
+                distance_car_ped_json,
+                crossing_value_json,
+                safety_distance_val
+            ))
+
+    return rows
+
+
+# ------------------------------------------------------------
+# Chargement MySQL
+# ------------------------------------------------------------
+def load_rows(cursor, table, columns, query, rows):
+    """
+    Insertion SQL groupée :
+    LOAD DATA LOCAL INFILE si activé (.env), sinon executemany par lots.
+    """
+    if local_infile_enabled():
+        load_data_infile(cursor, table, columns, rows)
+    else:
+        insert_many(cursor, query, rows)
+
+
+def run(perception=True, crossing=True):
+    """
+    Importe exp1 (Perception) et/ou exp2 (Crossing) en un seul parcours
+    de data/raw/, puis vide et recharge les tables dans une transaction
+    unique, annulée si le chargement échoue.
+    """
+    # Lignes à insérer, accumulées pour tous les participants
+    all_perception_rows = []
+    all_crossing_rows = []
+
+    # Pool de processus partagé par tous les participants :
+    # les trials (parsing CSV + NumPy) sont indépendants, donc répartis
+    # sur tous les cœurs ; l'insertion SQL reste dans ce processus.
+    with ProcessPoolExecutor() as executor:
+
+        for participant_id in list_participants(base_path):
+
+            print(participant_id)
+
+            # Chemin vers le dossier du participant
+            path = os.path.join(base_path, participant_id)
+
+            if perception:
+                all_perception_rows.extend(perception_rows(participant_id, path, executor))
+            if crossing:
+                all_crossing_rows.extend(crossing_rows(participant_id, path, executor))
+
+    # ------------------------------------------------------------
+    # Connexion MySQL via un helper externe, une fois toutes les lignes
+    # construites (une erreur de lecture des fichiers ne touche pas la base)
+    # ------------------------------------------------------------
+    conn, cursor = get_db_connection()
+    try:
+        begin_bulk_load(conn, cursor)
+
+        # Réinitialisation des tables importées : DELETE dans la même
+        # transaction que les insertions, annulé avec elles en cas d'erreur
+        if perception:
+            cursor.execute("DELETE FROM Perception")
+        if crossing:
+            cursor.execute("DELETE FROM Crossing")
+
+        if perception:
+            load_rows(cursor, "Perception", PERCEPTION_COLUMNS, INSERT_PERCEPTION, all_perception_rows)
+        if crossing:
+            load_rows(cursor, "Crossing", CROSSING_COLUMNS, INSERT_CROSSING, all_crossing_rows)
+
+        # Commit final (transaction unique)
+        end_bulk_load(conn, cursor)
+    except Exception:
+        # Échec du chargement : les anciennes lignes restent en place
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+    print("Insertion des données terminée avec succès.")
+
+
+# Garde indispensable : sous spawn (Windows / macOS), chaque processus du
+# pool ré-importe ce module — sans elle, il rouvrirait une connexion MySQL.
+if __name__ == "__main__":
+    run()
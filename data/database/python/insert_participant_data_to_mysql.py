@@ -1,13 +1,7 @@
 import pandas as pd
-from db_utils import get_db_connection
+from db_utils import get_db_connection, insert_many, begin_bulk_load, end_bulk_load
 import os
 
-# Connexion MySQL (chargée via db_utils + .env)
-conn, cursor = get_db_connection()
-
-# Vider la table avant insertion (reset complet)
-cursor.execute("DELETE FROM Participant")
-
 # Base path dynamique : le CSV est dans data/participants/participant.csv
 # Le chemin est construit à partir du dossier racine du repo.
 repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -16,36 +10,46 @@ base_path = os.path.join(repo_root, "data", "questionnaires", "participant.csv")
 # Chargement du fichier participant.csv
 df = pd.read_csv(base_path, sep=';')
 
-# Insertion ligne par ligne
-for index, row in df.iterrows():
-
-    participant_id = row['Participant'] if pd.notna(row['Participant']) else None
-    age            = row['Age']        if pd.notna(row['Age'])        else None
-    sex            = row['Sex']        if pd.notna(row['Sex'])        else None
-    height         = row['Height']     if pd.notna(row['Height'])     else None
-
-    driver_license = (
-        1 if row['Driver_license'] == True else
-        0 if row['Driver_license'] == False else
-        None
-    )
+# Préparation vectorisée des lignes (plus d'iterrows) :
+# - colonnes renommées selon le schéma SQL
+# - permis : True → 1, False → 0, vide → NULL
+# - toute valeur manquante → None (NULL côté MySQL)
+df = df.rename(columns={
+    'Participant': 'participant_id',
+    'Age': 'age',
+    'Sex': 'sex',
+    'Height': 'height',
+    'Driver_license': 'driver_license',
+    'Scale': 'scale',
+})[['participant_id', 'age', 'sex', 'height', 'driver_license', 'scale']]
+df['driver_license'] = df['driver_license'].map({True: 1, False: 0})
+df = df.astype(object).where(df.notna(), None)
+
+# executemany regroupe ces tuples en INSERT multi-VALUES
+rows = list(df.itertuples(index=False, name=None))
+
+# Connexion MySQL (chargée via db_utils + .env), une fois le CSV lu et
+# préparé : une erreur de lecture ne touche pas la base
+conn, cursor = get_db_connection()
 
-    scale = row['Scale'] if pd.notna(row['Scale']) else None
+# Vidage + insertions dans une seule transaction (COMMIT unique en fin de
+# script) : DELETE plutôt que TRUNCATE, pour pouvoir tout annuler si
+# l'insertion échoue
+try:
+    begin_bulk_load(conn, cursor)
+    cursor.execute("DELETE FROM Participant")
 
-    cursor.execute("""
-        INSERT INTO Participant (participant_id, age, sex, height, driver_license, scale) 
+    insert_many(cursor, """
+        INSERT INTO Participant (participant_id, age, sex, height, driver_license, scale)
         VALUES (%s, %s, %s, %s, %s, %s)
-    """, (
-        participant_id,
-        age,
-        sex,
-        height,
-        driver_license,
-        scale
-    ))
-
-# Sauvegarde SQL
-conn.commit()
-
-cursor.close()
-conn.close()
+    """, rows)
+
+    # Sauvegarde SQL (COMMIT unique + rétablissement des contrôles)
+    end_bulk_load(conn, cursor)
+except Exception:
+    # Échec : la table Participant garde ses anciennes lignes
+    conn.rollback()
+    raise
+finally:
+    cursor.close()
+    conn.close()
@@ -0,0 +1,43 @@
+import numpy as np
+
+
+# ------------------------------------------------------------
+# Noyau de calcul d'un trial exp2 (Crossing)
+# ------------------------------------------------------------
+def analyze_trial(crossing, xcars, pos_ref):
+    """
+    Analyse un trial exp2 à partir des tableaux synchronisés.
+
+    Paramètres :
+        - crossing : valeurs 0/1 du Crossing (après correction)
+        - xcars    : position X du véhicule (cm)
+        - pos_ref  : position X du piéton (cm)
+
+    Retourne (dist, safety, start_x, stop_x) :
+        - dist    : distance voiture → piéton en mètres
+        - safety  : |stop_x - pos_ref| en mètres
+        - start_x : X_cars à la première transition 0 -> 1
+        - stop_x  : X_cars à la première transition 1 -> 0
+    Transition ou safety introuvable → NaN.
+    """
+    dist = (xcars - pos_ref) / 100.0
+
+    # Indices des changements de valeur (une seule passe C) :
+    # la boucle Python ne parcourt ensuite que ces quelques indices.
+    transitions = np.flatnonzero(crossing[1:] != crossing[:-1])
+
+    start_x = np.nan
+    stop_x = np.nan
+
+    for i in transitions:
+        if np.isnan(start_x) and crossing[i] == 0 and crossing[i + 1] == 1:
+            start_x = xcars[i]
+        elif np.isnan(stop_x) and crossing[i] == 1 and crossing[i + 1] == 0:
+            stop_x = xcars[i]
+
+        if not np.isnan(start_x) and not np.isnan(stop_x):
+            break
+
+    safety = abs((stop_x - pos_ref) / 100.0)  # NaN si pas de fin de crossing
+
+    return dist, safety, start_x, stop_x
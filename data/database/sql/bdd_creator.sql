@@ -70,6 +70,11 @@ CREATE TABLE Perception (
     velocity_id FLOAT,                              -- Vitesse du véhicule
     distance_id FLOAT,                              -- Distance de disparition du véhicule
 
+    -- Lecture par participant déjà triée vitesse → météo → distance
+    -- (page de perception par participant) : sert aussi d'index à la
+    -- clé étrangère participant_id
+    INDEX idx_perception_participant (participant_id, velocity_id, weather_id, distance_id),
+
     -- Contraintes d'intégrité
     FOREIGN KEY (participant_id) REFERENCES Participant(participant_id),
     FOREIGN KEY (weather_id) REFERENCES Weather(id),
@@ -88,8 +93,8 @@ CREATE TABLE Crossing (
     position_id INT,                              -- Position du piéton
     velocity_id FLOAT,                            -- Vitesse du véhicule
     
-    distance_car_ped JSON,                        -- Distances véhicule-piéton synchronisées (format JSON)
-    crossing_value JSON,                          -- Valeur 0/1 du crossing en continu (format JSON)
+    distance_car_ped JSON,                        -- Distances véhicule-piéton synchronisées (JSON, float32 si orjson)
+    crossing_value JSON,                          -- Valeur 0/1 du crossing en continu (JSON d'entiers 0/1)
     safety_distance FLOAT,                        -- Distance au moment où la décision passe de 1 à 0
 
     -- Contraintes d'intégrité
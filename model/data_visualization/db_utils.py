@@ -8,6 +8,7 @@ Ce module fournit deux façons de se connecter à MySQL :
    → Utilisé *par Streamlit Cloud*.
      Les identifiants sont lus dans st.secrets (fichier secrets.toml sur Streamlit Cloud).
      C’est la méthode standard pour les apps déployées.
+     Les connexions proviennent d’un pool partagé (créé une fois par processus).
 
 2) get_py_db_connection()
    → Connexion via PyMySQL pour un usage local.
@@ -21,7 +22,6 @@ Ce découplage permet :
 import os
 from pathlib import Path
 import streamlit as st
-import mysql.connector
 
 
 # ----------------------------------------------------------------------
@@ -88,7 +88,64 @@ def _read_env():
 # ----------------------------------------------------------------------
 # Connexion MySQL pour Streamlit Cloud
 # ----------------------------------------------------------------------
-def get_db_connection():
+@st.cache_resource(show_spinner=False)
+def _get_pool():
+    """
+    Pool de connexions MySQL partagé par toutes les pages et toutes les sessions.
+
+    Streamlit ré-exécute le script à chaque interaction : sans pool, chaque
+    rechargement de page paierait une poignée de main TCP + TLS + auth.
+    Le pool est créé une seule fois par processus (st.cache_resource).
+    """
+    # Import différé : mysql-connector n'est chargé qu'à la première connexion
+    import mysql.connector.pooling
+
+    # Session remise à zéro (COM_RESET_CONNECTION) à chaque restitution
+    # au pool (pool_reset_session par défaut) : aucune transaction ni
+    # verrou de métadonnées ne survit d'une page à l'autre.
+    # Les connexions coupées par le serveur sont rouvertes par le pool
+    # lui-même au prochain get_connection().
+    return mysql.connector.pooling.MySQLConnectionPool(
+        pool_name="viz",
+        pool_size=8,
+        **_secrets_config()
+    )
+
+
+def _secrets_config():
+    """
+    Paramètres de connexion MySQL lus dans st.secrets.
+
+    - autocommit=True : chaque SELECT est sa propre transaction ; une
+      connexion du pool ne garde ni instantané REPEATABLE READ (données
+      d'avant une réimportation) ni verrou de métadonnées sur les tables
+      (qui bloquerait toute modification de leur structure).
+    - consume_results=True : un résultat en streaming interrompu
+      (exception pendant l'itération) est lu jusqu'au bout à la fermeture
+      du curseur, au lieu de laisser des lignes non lues sur la connexion.
+    """
+    return dict(
+        host=st.secrets["DB_HOST"],
+        port=int(st.secrets["DB_PORT"]),
+        user=st.secrets["DB_USER"],
+        password=st.secrets["DB_PASSWORD"],
+        database=st.secrets["DB_NAME"],
+        autocommit=True,
+        consume_results=True,
+    )
+
+
+def db_identity():
+    """
+    Identifiant lisible de la base interrogée par get_db_connection()
+    ("nom@hôte_port"), sans le mot de passe : sert à séparer par base les
+    fichiers mis en cache sur disque (instantanés parquet des pages).
+    """
+    cfg = _secrets_config()
+    return f"{cfg['database']}@{cfg['host']}_{cfg['port']}"
+
+
+def get_db_connection(streaming=False):
     """
     Connexion MySQL privilégiée pour Streamlit Cloud.
 
@@ -98,17 +155,28 @@ def get_db_connection():
 
     Cette fonction est appelée par tous les scripts du dossier /features.
     Elle retourne :
-        conn   : connexion MySQL ouverte
-        cursor : curseur mysql.connector
+        conn   : connexion MySQL empruntée au pool (_get_pool)
+        cursor : curseur mysql.connector, neuf à chaque appel ; bufferisé
+                 par défaut, non bufferisé si streaming=True
+
+    streaming=True : les lignes sont lues au fil de l'itération
+    (`for row in cursor`) au lieu d'être toutes copiées dans le buffer du
+    driver avant la première lecture. À réserver aux gros SELECT parcourus
+    une seule fois. Si la lecture est interrompue, cursor.close() vide le
+    reste du résultat (consume_results) avant que conn.close() ne rende
+    la connexion au pool.
+
+    conn.close() ne ferme pas la connexion : il la rend au pool.
+    Si le pool est épuisé (sessions simultanées), on ouvre une connexion
+    directe plutôt que d'échouer ; conn.close() la ferme alors réellement.
     """
-    conn = mysql.connector.connect(
-        host=st.secrets["DB_HOST"],
-        port=int(st.secrets["DB_PORT"]),
-        user=st.secrets["DB_USER"],
-        password=st.secrets["DB_PASSWORD"],
-        database=st.secrets["DB_NAME"]
-    )
-    cursor = conn.cursor()
+    import mysql.connector
+
+    try:
+        conn = _get_pool().get_connection()
+    except mysql.connector.errors.PoolError:
+        conn = mysql.connector.connect(**_secrets_config())
+    cursor = conn.cursor(buffered=not streaming)
     return conn, cursor
 
 
@@ -0,0 +1,8 @@
+"""
+Pages de visualisation de l'application Streamlit.
+
+Un module par page, chacun exposant une fonction render() ;
+app.py importe ces modules une seule fois et référence leurs render()
+dans PAGES (ne pas dupliquer un module : chaque copie aurait son propre
+cache st.cache_* et relancerait ses requêtes MySQL).
+"""
@@ -0,0 +1,314 @@
+"""
+Chargement partagé de la table `crossing`.
+
+Utilisé par les pages de crossing par participant
+(features/participant_*crossing_vs_distance*.py) : un seul module, donc
+un seul cache st.cache_resource par requête MySQL pour toutes les pages.
+
+Contenu :
+- load_crossing_avg() : moyenne / écart-type de la safety_distance par
+  participant × météo × vitesse ; load_crossing_avg_by_participant() :
+  le même résultat découpé une fois par participant.
+- list_participants() / load_participant_series(pid) : séries brutes
+  crossing(distance) d'un participant, décodées en tableaux NumPy
+  contigus par cellule météo × position.
+"""
+
+from __future__ import annotations
+
+import importlib.util
+import json
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+# Import flexible, utile sur Streamlit Cloud
+try:
+    from db_utils import get_db_connection
+except Exception:
+    get_db_connection = None
+
+# Agrégation NumPy par segments, partagée avec les pages de perception
+# et instantanés parquet (même ttl que les pages de perception)
+from ._perception_loader import (
+    SNAPSHOT_DIR, SNAPSHOT_TTL, WEATHER_ORDER, load_snapshot, mean_std, segment_moments,
+    typed_frame,
+)
+
+# Décodage JSON : orjson (parseur C, lit directement les bytes MySQL)
+# s'il est installé, sinon json standard.
+if importlib.util.find_spec("orjson"):
+    import orjson
+    _json_loads = orjson.loads
+else:
+    _json_loads = json.loads
+
+# Nom de la table Crossing dans les requêtes : même casse que le schéma
+# (bdd_creator.sql) et l'ingestion, comme PERCEPTION_TABLE
+CROSSING_TABLE = "Crossing"
+
+# Nombre maximal de points conservés par essai pour l'affichage : au-delà,
+# sous-échantillonnage à pas régulier (écart invisible sur la grille 3×3,
+# charge JSON envoyée au navigateur divisée d'autant)
+MAX_TRIAL_POINTS = 2000
+
+# Instantané parquet des moyennes par participant (voir load_snapshot)
+CROSSING_AVG_SNAPSHOT = SNAPSHOT_DIR / "crossing_avg.parquet"
+
+# Colonnes lues pour les moyennes par participant et leur type : clés
+# compactes (quelques valeurs répétées → catégories, codes int8 ; vitesses
+# 20…70 km/h exactes en float32), safety_distance en float64 (sa somme des
+# carrés sert à l'écart-type)
+CROSSING_AVG_DTYPES = {
+    "participant_id": "category",
+    "weather_id": pd.CategoricalDtype(WEATHER_ORDER),
+    "velocity_id": np.float32,
+    "safety_distance": np.float64,
+}
+
+
+def _fetch_crossing_avg() -> pd.DataFrame:
+    """
+    Lit la table 'crossing' et calcule la moyenne & écart-type
+    de la safety_distance par :
+        (participant_id, weather_id, velocity_id)
+    """
+    if get_db_connection is None:
+        raise RuntimeError("db_utils.get_db_connection introuvable/import impossible.")
+
+    # Curseur non bufferisé : fetchall() lit le résultat directement,
+    # sans copie préalable dans le buffer du driver.
+    # position_id n'est pas sélectionné (inutile pour l'agrégation).
+    conn, cursor = get_db_connection(streaming=True)
+    try:
+        cursor.execute(f"SELECT {', '.join(CROSSING_AVG_DTYPES)} FROM {CROSSING_TABLE};")
+        cols = [c[0] for c in cursor.description]
+        rows = cursor.fetchall()
+    finally:
+        try: cursor.close()
+        except Exception: pass
+        try: conn.close()
+        except Exception: pass
+
+    df = typed_frame(cols, rows, CROSSING_AVG_DTYPES).dropna()
+    if df.empty:
+        return df
+
+    # Agrégation par combinaison [participant, météo, vitesse] : chaque
+    # essai est une mesure (n = 1, M2 = 0) combinée par segment
+    # (np.add.reduceat), puis moyenne et écart-type (ddof=1, NaN si un seul essai)
+    df = df.assign(n=1, m2=0.0)
+    grouped = segment_moments(df, ["participant_id", "weather_id", "velocity_id"], "safety_distance", "m2")
+    mean, std = mean_std(grouped)
+    return pd.DataFrame({"mean": mean, "std": std}).reset_index()
+
+
+@st.cache_resource(show_spinner=False, ttl=SNAPSHOT_TTL)
+def load_crossing_avg() -> pd.DataFrame:
+    """
+    Moyenne & écart-type de la safety_distance par
+    (participant_id, weather_id, velocity_id).
+
+    Cela permet d’obtenir :
+        - un safety_distance moyen pour chaque config
+        - un écart-type qui sera affiché en barre d’erreur
+
+    Le résultat agrégé passe par un instantané parquet (load_snapshot) :
+    un redémarrage ou un autre worker le relit sans rescanner la table.
+    st.cache_resource partage le DataFrame entre sessions sans le
+    désérialiser à chaque rerun (ne pas le modifier en place).
+    """
+    return load_snapshot(CROSSING_AVG_SNAPSHOT, _fetch_crossing_avg)
+
+
+@st.cache_resource(show_spinner=False, ttl=SNAPSHOT_TTL)
+def load_crossing_avg_by_participant() -> Dict[Any, pd.DataFrame]:
+    """
+    load_crossing_avg() découpé une seule fois en un sous-tableau par
+    participant (clés triées), restreint aux météos attendues et trié
+    météo puis vitesse.
+
+    Sélectionner un participant devient une lecture de dictionnaire au
+    lieu d'un masque sur toute la table à chaque rerun.
+    """
+    avg = load_crossing_avg()
+    avg = avg[avg["weather_id"].isin(WEATHER_ORDER)]
+    avg = avg.sort_values(["participant_id", "weather_id", "velocity_id"], kind="stable")
+    return {
+        pid: part.reset_index(drop=True)
+        for pid, part in avg.groupby("participant_id", sort=True, observed=True)
+    }
+
+
+@st.cache_resource(show_spinner=False, ttl=SNAPSHOT_TTL)
+def list_participants() -> List[Any]:
+    """
+    Liste triée des participants présents dans la table `crossing`.
+
+    Requête minimale (DISTINCT sur participant_id, couvert par l'index
+    créé par InnoDB pour la clé étrangère vers Participant).
+    """
+    if get_db_connection is None:
+        raise RuntimeError("db_utils.get_db_connection introuvable/import impossible.")
+
+    conn, cursor = get_db_connection()
+    try:
+        cursor.execute(
+            f"SELECT DISTINCT participant_id FROM {CROSSING_TABLE} ORDER BY participant_id;"
+        )
+        rows = cursor.fetchall()
+    finally:
+        try: cursor.close()
+        except Exception: pass
+        try: conn.close()
+        except Exception: pass
+
+    return [row[0] for row in rows]
+
+
+def _decode_series(raw, memo: Dict[Any, np.ndarray]) -> np.ndarray:
+    """
+    JSON (liste de nombres) → tableau float32 en lecture seule.
+
+    Des essais enregistrent souvent exactement la même séquence (surtout
+    crossing_value) : chaque contenu distinct n'est décodé qu'une fois,
+    les suivants réutilisent le tableau mémorisé dans `memo`.
+    """
+    if not raw:
+        return np.empty(0, dtype=np.float32)
+    if isinstance(raw, bytearray):
+        raw = bytes(raw)
+    arr = memo.get(raw)
+    if arr is None:
+        arr = np.asarray(_json_loads(raw), dtype=np.float32)
+        arr.flags.writeable = False
+        memo[raw] = arr
+    return arr
+
+
+def _pack_cell(trials: List[Tuple[float, Any, np.ndarray, np.ndarray]]) -> Dict[str, np.ndarray]:
+    """
+    Regroupe les essais d'une cellule (météo, position) en tableaux
+    contigus (structure de tableaux, façon CSR) :
+    - velocity_id, crossing_id : une valeur par essai
+    - offsets : bornes des essais, l'essai i occupe [offsets[i], offsets[i+1])
+    - distance, crossing : séries de tous les essais mises bout à bout
+    """
+    velocity_ids, crossing_ids, dists, cross = zip(*trials)
+    offsets = np.zeros(len(trials) + 1, dtype=np.int64)
+    np.cumsum([d.size for d in dists], out=offsets[1:])
+    return {
+        "velocity_id": np.asarray(velocity_ids, dtype=np.float32),
+        "crossing_id": np.asarray(crossing_ids),
+        "offsets": offsets,
+        "distance": np.concatenate(dists),
+        "crossing": np.concatenate(cross),
+    }
+
+
+@st.cache_resource(show_spinner=False, ttl=SNAPSHOT_TTL)
+def load_participant_series(participant_id) -> Dict[str, Dict[int, Dict[str, np.ndarray]]]:
+    """
+    Charge les séries brutes crossing(distance) d'un seul participant.
+
+    Requête :
+        SELECT weather_id, position_id, velocity_id,
+               distance_car_ped, crossing_value, crossing_id
+        FROM Crossing
+        WHERE participant_id = %s;
+
+    Le filtre est fait par MySQL (index sur participant_id) : seuls les
+    JSON du participant affiché sont transférés et décodés, au fil de la
+    lecture (curseur non bufferisé : les JSON bruts ne sont jamais tous
+    en mémoire en même temps que les tableaux décodés). Le résultat
+    est mis en cache par participant et partagé entre sessions
+    (st.cache_resource : ne pas le modifier en place).
+
+    Remarque :
+    - distance_car_ped et crossing_value sont des JSON (listes synchronisées),
+      décodés directement en tableaux NumPy float32.
+    - position_id = 1 implique inversion du signe de distance (hérité du script Dash).
+    - Les tableaux sont tronqués à la même longueur pour éviter les problèmes
+      de longueur incohérente.
+    - Au-delà de MAX_TRIAL_POINTS points, un essai est sous-échantillonné
+      à pas régulier (données destinées à l'affichage uniquement).
+
+    Retour :
+    Un dictionnaire imbriqué, une cellule par (météo, position) :
+        data[weather][position] = {
+            "velocity_id": np.ndarray,   # une valeur par essai
+            "crossing_id": np.ndarray,   # une valeur par essai
+            "offsets": np.ndarray,       # essai i = [offsets[i], offsets[i+1])
+            "distance": np.ndarray,      # séries concaténées
+            "crossing": np.ndarray,      # séries concaténées
+        }
+    """
+    if get_db_connection is None:
+        raise RuntimeError("db_utils.get_db_connection introuvable/import impossible.")
+
+    # Essais lus, par cellule (weather, position), dans l'ordre de lecture
+    trials: Dict[Tuple[str, int], List[Tuple[float, Any, np.ndarray, np.ndarray]]] = {}
+
+    # Séquences JSON déjà décodées pendant cette lecture (voir _decode_series)
+    decoded: Dict[Any, np.ndarray] = {}
+
+    conn, cursor = get_db_connection(streaming=True)
+    try:
+        cursor.execute(
+            "SELECT weather_id, position_id, velocity_id, distance_car_ped, crossing_value, crossing_id "
+            f"FROM {CROSSING_TABLE} WHERE participant_id = %s;",
+            (participant_id,),
+        )
+
+        # Parcours ligne par ligne, au fil de la lecture
+        for row in cursor:
+            weather_id = row[0]
+            position_id = int(row[1]) if row[1] is not None else None
+            velocity_id = float(row[2]) if row[2] is not None else None
+
+            # Vérification des valeurs essentielles
+            if position_id is None or velocity_id is None or weather_id is None:
+                continue
+
+            # distance et crossing sous forme JSON → tableaux float32
+            try:
+                dists = _decode_series(row[3], decoded)
+                cross = _decode_series(row[4], decoded)
+            except (TypeError, ValueError):
+                continue
+
+            # Assainissement : garder uniquement la longueur minimale des deux tableaux
+            n = min(dists.size, cross.size)
+            if n == 0:
+                continue
+            dists = dists[:n]
+            cross = cross[:n]
+
+            # Essais très longs : un point sur `step` (au plus MAX_TRIAL_POINTS)
+            if n > MAX_TRIAL_POINTS:
+                step = -(-n // MAX_TRIAL_POINTS)
+                dists = dists[::step]
+                cross = cross[::step]
+
+            # Alignement de signe spécifique à position 1 (héritage du script original)
+            # (nouveau tableau : le tableau décodé peut être partagé entre essais)
+            if position_id == 1:
+                dists = np.negative(dists)
+
+            trials.setdefault((str(weather_id), position_id), []).append(
+                (velocity_id, row[5], dists, cross)
+            )
+    finally:
+        try: cursor.close()
+        except Exception: pass
+        try: conn.close()
+        except Exception: pass
+
+    # Structure imbriquée weather → position → cellule en tableaux contigus
+    participant_data: Dict[str, Dict[int, Dict[str, np.ndarray]]] = {}
+    for (weather_id, position_id), cell_trials in trials.items():
+        participant_data.setdefault(weather_id, {})[position_id] = _pack_cell(cell_trials)
+
+    return participant_data
@@ -0,0 +1,50 @@
+"""
+Cache des figures Plotly dans la session Streamlit (pas une page).
+
+Utilisé par toutes les pages : une figure n'est reconstruite que si les
+données affichées ont changé, c'est-à-dire si le chargeur mis en cache
+(st.cache_resource) renvoie un nouvel objet. Chaque session garde au plus
+MAX_ENTRIES figures, toutes pages confondues (LRU).
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+import streamlit as st
+
+# Clé st.session_state du cache, commun à toutes les pages
+STATE_KEY = "figure_cache"
+
+# Nombre maximal de figures gardées par session : au-delà, la moins
+# récemment affichée est oubliée (elle sera reconstruite si besoin)
+MAX_ENTRIES = 32
+
+
+def cached_figure(key: Hashable, token: Any, build: Callable[[], Any],
+                  max_entries: int = MAX_ENTRIES) -> Any:
+    """
+    Figure `key` de la session, construite par `build()` seulement si elle
+    est absente ou si `token` n'est plus le même objet.
+
+    - key   : identifiant de la figure, par ex. (__name__, participant_id)
+    - token : données affichées, comparées par identité (pas par égalité) :
+              un chargeur st.cache_resource renvoie le même objet tant que
+              son cache est valide, un nouveau après expiration.
+    - build : fonction sans argument qui construit la figure (ou un tuple
+              de figures)
+    """
+    cache = st.session_state.setdefault(STATE_KEY, OrderedDict())
+
+    entry = cache.get(key)
+    if entry is None or entry[0] is not token:
+        entry = (token, build())
+        cache[key] = entry
+
+    # Entrée la plus récente en fin de dictionnaire ; éviction des plus anciennes
+    cache.move_to_end(key)
+    while len(cache) > max_entries:
+        cache.popitem(last=False)
+
+    return entry[1]
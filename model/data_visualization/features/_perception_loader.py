@@ -0,0 +1,434 @@
+"""
+Chargement partagé de la table `perception`.
+
+Utilisé par toutes les pages de perception (features/avg_perc_dist_*.py,
+participant_perc_dist_by_velocity_weather.py) : un seul module, donc un
+seul cache st.cache_resource par requête MySQL pour toutes les pages.
+
+Contenu :
+- load_perception_df() : effectif, moyenne et somme des carrés des écarts
+  (M2) par cellule vitesse × météo × distance, agrégés côté serveur.
+- list_participants() / load_participant_perception(pid) : mesures brutes
+  d'un participant, triées vitesse → météo → distance.
+- segment_moments() / mean_std() : combinaison de ces statistiques par
+  n'importe quelle clé (distance, temps réel, groupe de vitesse, météo).
+"""
+
+from __future__ import annotations
+
+import getpass
+import importlib.util
+import os
+import re
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Tuple
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+# Import flexible : permet au module d'être importé dans Streamlit Cloud
+# même si db_utils n'existe pas encore au moment du build
+try:
+    from db_utils import db_identity, get_db_connection
+except Exception:
+    db_identity = get_db_connection = None
+
+# Définition des groupes de vitesse utilisés pour catégoriser l’expérience
+# Les valeurs correspondent aux vitesses en km/h présentes dans la base VR
+VELOCITY_GROUPS: Dict[str, Tuple[float, float]] = {
+    "low": (20.0, 30.0),
+    "medium": (40.0, 50.0),
+    "high": (60.0, 70.0),
+}
+
+
+# Conditions météo (catégories de weather_id, dans l'ordre d'affichage)
+WEATHER_ORDER = ["clear", "rain", "night"]
+
+
+def categorize_velocity(v: np.ndarray) -> pd.Categorical:
+    """
+    Associe chaque vitesse (km/h) à un groupe ('low', 'medium', 'high'), en une passe vectorisée.
+
+    Remarque :
+    - Dans les données VR, velocity_id contient les vitesses exactes : 20/30/40/50/60/70.
+    - On retourne "unknown" si la valeur ne correspond pas à un intervalle connu.
+    - Résultat catégoriel ordonné (low < medium < high) : les groupby
+      travaillent sur des codes entiers et suivent l'ordre des vitesses.
+    """
+    groups = list(VELOCITY_GROUPS)
+
+    # Vitesses connues triées, et code de groupe associé à chacune
+    speeds = np.array([s for pair in VELOCITY_GROUPS.values() for s in pair], dtype=np.float64)
+    group_codes = np.repeat(np.arange(len(groups)), [len(p) for p in VELOCITY_GROUPS.values()])
+    order = np.argsort(speeds)
+    speeds, group_codes = speeds[order], group_codes[order]
+
+    # Recherche dichotomique : codes entiers directement, sans tableau de libellés
+    v = np.asarray(v, dtype=np.float64)
+    pos = np.minimum(np.searchsorted(speeds, v), len(speeds) - 1)
+    codes = np.where(speeds[pos] == v, group_codes[pos], len(groups))  # len(groups) → "unknown"
+    return pd.Categorical.from_codes(codes, categories=groups + ["unknown"], ordered=True)
+
+
+# Nom de la table Perception dans les requêtes, commun à toutes les pages :
+# même casse que le schéma (bdd_creator.sql) et l'ingestion, indispensable
+# si MySQL distingue la casse des noms de tables (lower_case_table_names=0,
+# défaut sous Linux)
+PERCEPTION_TABLE = "Perception"
+
+# Lignes exploitables de la table Perception, communes à toutes les requêtes
+# (statistiques, mesures d'un participant, liste des participants) : un
+# participant n'est proposé que s'il a au moins une mesure affichable.
+# velocity_id <> 0 évite la division par zéro du passage en m/s.
+_VALID_ROWS = "\n      AND ".join([
+    "participant_id IS NOT NULL",
+    "perceived_distance IS NOT NULL",
+    "weather_id IS NOT NULL",
+    "velocity_id IS NOT NULL",
+    "distance_id IS NOT NULL",
+    "velocity_id <> 0",
+])
+
+# Statistiques calculées par MySQL pour chaque cellule (vitesse, météo,
+# distance) : effectif, moyenne et M2 = somme des carrés des écarts à la
+# moyenne (VAR_POP × n, calculée de façon stable par le serveur). Elles se
+# combinent entre cellules (groupes de vitesse, temps réel) par la formule
+# de variance parallèle (segment_moments), sans jamais soustraire deux
+# grandes sommes de carrés.
+PERCEPTION_STATS_SQL = f"""
+    SELECT velocity_id, weather_id, distance_id,
+           COUNT(*) AS n,
+           AVG(perceived_distance) AS mean_pd,
+           VAR_POP(perceived_distance) * COUNT(*) AS m2_pd
+    FROM {PERCEPTION_TABLE}
+    WHERE {_VALID_ROWS}
+    GROUP BY velocity_id, weather_id, distance_id;
+"""
+
+# Colonnes retournées par PERCEPTION_STATS_SQL et leur type
+# (météo directement en catégoriel : aucune colonne object)
+PERCEPTION_STATS_DTYPES = {
+    "velocity_id": np.float64,
+    "weather_id": pd.CategoricalDtype(WEATHER_ORDER),
+    "distance_id": np.float64,
+    "n": np.int64,
+    "mean_pd": np.float64,
+    "m2_pd": np.float64,
+}
+
+
+def _snapshot_dir() -> Path:
+    """
+    Dossier des instantanés parquet : sous-dossier du répertoire temporaire
+    propre à l'application et à l'utilisateur système, puis à la base
+    interrogée (nom, hôte, port). Deux applications, utilisateurs ou bases
+    d'une même machine ne lisent donc jamais le fichier d'un autre.
+    """
+    try:
+        user = getpass.getuser()
+    except Exception:
+        user = "user"
+    try:
+        db = db_identity()
+    except Exception:
+        db = "default"
+
+    # Noms de dossiers sûrs (hôte ou nom de base quelconques)
+    app_dir = re.sub(r"[^\w.@-]", "_", f"pedestrian-crossing-viz-{user}")
+    return Path(tempfile.gettempdir()) / app_dir / re.sub(r"[^\w.@-]", "_", db)
+
+
+# Instantanés parquet des résultats agrégés, partagés par tous les workers
+# Streamlit de l'application : un démarrage à froid lit ces fichiers au lieu
+# d'interroger MySQL. Utilisés seulement si pyarrow est installé.
+#
+# Fraîcheur : un instantané n'est relu que s'il a moins de
+# SNAPSHOT_MAX_AGE secondes, et le cache mémoire (ttl=SNAPSHOT_TTL) garde
+# le résultat au plus SNAPSHOT_TTL secondes : après une réimportation, les
+# pages peuvent montrer les anciennes données pendant au plus
+# SNAPSHOT_TTL + SNAPSHOT_MAX_AGE secondes (15 min).
+SNAPSHOT_DIR = _snapshot_dir()
+SNAPSHOT_PATH = SNAPSHOT_DIR / "perception_moments.parquet"
+SNAPSHOT_TTL = 600  # secondes
+SNAPSHOT_MAX_AGE = SNAPSHOT_TTL // 2  # secondes
+HAS_PYARROW = importlib.util.find_spec("pyarrow") is not None
+
+
+def typed_frame(cols: list, rows: list, dtypes: Dict[str, Any]) -> pd.DataFrame:
+    """
+    DataFrame des colonnes de `dtypes` (dans cet ordre) à partir des lignes
+    d'un curseur MySQL et de ses noms de colonnes `cols`.
+
+    Transposition lignes → colonnes, puis un tableau typé par colonne :
+    pas d'inférence de types sur une liste de tuples, pas de colonnes
+    object intermédiaires ni de astype après coup (NULL → NaN).
+    """
+    columns = dict(zip(cols, zip(*rows))) if rows else {c: () for c in cols}
+    return pd.DataFrame({c: pd.array(columns[c], dtype=dtype) for c, dtype in dtypes.items()})
+
+
+def _fetch_perception_stats() -> pd.DataFrame:
+    """
+    Exécute PERCEPTION_STATS_SQL et retourne le résultat brut (une ligne par cellule).
+
+    Le DataFrame est construit colonne par colonne à partir de tableaux
+    typés (PERCEPTION_STATS_DTYPES), sans passer par une liste de lignes en
+    colonnes object ni par pd.to_numeric. La météo est un catégoriel dès la
+    lecture (valeur inconnue → NaN), ce que l'instantané parquet conserve.
+    """
+    if get_db_connection is None:
+        raise RuntimeError("db_utils.get_db_connection introuvable/import impossible.")
+
+    conn, cursor = get_db_connection()
+    try:
+        cursor.execute(PERCEPTION_STATS_SQL)
+        cols = [c[0] for c in cursor.description]
+        rows = cursor.fetchall()
+    finally:
+        # Toujours fermer proprement la connexion MySQL
+        try: cursor.close()
+        except Exception: pass
+        try: conn.close()
+        except Exception: pass
+
+    return typed_frame(cols, rows, PERCEPTION_STATS_DTYPES)
+
+
+def load_snapshot(path: Path, fetch: Callable[[], pd.DataFrame]) -> pd.DataFrame:
+    """
+    Résultat de `fetch()` via un instantané parquet : le fichier `path` est
+    lu s'il a moins de SNAPSHOT_MAX_AGE secondes, sinon `fetch()` interroge
+    MySQL et l'instantané est réécrit. Sans pyarrow, appelle fetch() seul.
+
+    Sert aux chargeurs mis en cache (st.cache_resource) : le cache mémoire
+    évite les requêtes entre reruns, l'instantané entre redémarrages et
+    entre workers. Les types (catégoriels compris) sont conservés.
+    """
+    if HAS_PYARROW:
+        try:
+            if time.time() - os.path.getmtime(path) < SNAPSHOT_MAX_AGE:
+                return pd.read_parquet(path, engine="pyarrow")
+        except (OSError, ValueError):
+            # Instantané absent ou illisible → on repasse par MySQL
+            pass
+
+    df = fetch()
+
+    if HAS_PYARROW and not df.empty:
+        try:
+            # Écriture atomique : les autres workers ne lisent jamais un fichier partiel
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+            df.to_parquet(tmp_path, engine="pyarrow", index=False)
+            os.replace(tmp_path, path)
+        except (OSError, ValueError):
+            pass
+
+    return df
+
+
+@st.cache_resource(show_spinner=False, ttl=SNAPSHOT_TTL)
+def load_perception_df() -> pd.DataFrame:
+    """
+    Charge les statistiques agrégées de la table `perception` depuis MySQL.
+
+    L'agrégation est faite côté serveur (GROUP BY vitesse/météo/distance) :
+    seules quelques dizaines de lignes transitent au lieu de la table entière.
+
+    Colonnes retournées :
+    - velocity_id, weather_id, distance_id, velocity_ms (m/s)
+    - n, mean_pd, m2_pd : effectif, moyenne et somme des carrés des écarts
+      de la distance perçue
+    - real_time : temps réel (distance / vitesse)
+    - mean_pt, m2_pt : mêmes statistiques pour le temps perçu
+    - velocity_group, weather_id : catégoriels (low/medium/high, clear/rain/night)
+
+    Le cache est important : évite de recharger la base à chaque interaction Streamlit.
+    st.cache_resource partage le DataFrame entre toutes les sessions du worker
+    (il ne doit donc pas être modifié en place par les appelants).
+    """
+
+    df = load_snapshot(SNAPSHOT_PATH, _fetch_perception_stats)
+
+    if df.empty:
+        return df
+
+    # Temps réel de chaque cellule ; le temps perçu vaut distance perçue / vitesse,
+    # vitesse constante dans la cellule : sa moyenne est divisée par la
+    # vitesse et son M2 par le carré de la vitesse.
+    # Calcul sur tableaux NumPy bruts, en float64 : real_time sert de clé de
+    # regroupement (float32 fusionnerait des temps que l'original distingue).
+    # velocity_ms est calculé ici et non par MySQL : v * (5/18) en double,
+    # comme la version originale. (v * 5) / 18 côté serveur diffère au
+    # dernier bit et regrouperait autrement les cellules de même temps réel.
+    vms = df["velocity_id"].to_numpy() * (5.0 / 18.0)
+    df["velocity_ms"] = vms
+    df["real_time"] = df["distance_id"].to_numpy() / vms
+    df["mean_pt"] = df["mean_pd"].to_numpy() / vms
+    df["m2_pt"] = df["m2_pd"].to_numpy() / (vms * vms)
+
+    # Catégorisation des vitesses (météo déjà catégorielle, voir _fetch_perception_stats)
+    df["velocity_group"] = categorize_velocity(df["velocity_id"].to_numpy())
+
+    # Pas de tri ici : segment_moments ordonne lui-même les clés (distance /
+    # temps, groupe, météo), ce qui suffit à l'ordre des courbes
+
+    return df
+
+
+# Colonnes lues pour un participant et leur type
+PARTICIPANT_DTYPES = {
+    "velocity_id": np.float64,
+    "weather_id": str,
+    "distance_id": np.float64,
+    "perceived_distance": np.float64,
+}
+
+# Mesures complètes d'un participant, déjà triées comme la version
+# Matplotlib/Dash originale (vitesse → météo → distance).
+PARTICIPANT_SQL = f"""
+    SELECT {", ".join(PARTICIPANT_DTYPES)}
+    FROM {PERCEPTION_TABLE}
+    WHERE participant_id = %s
+      AND {_VALID_ROWS}
+    ORDER BY velocity_id, weather_id, distance_id;
+"""
+
+
+@st.cache_resource(show_spinner=False, ttl=SNAPSHOT_TTL)
+def list_participants() -> list:
+    """
+    Liste triée des participants ayant au moins une mesure exploitable
+    dans la table `perception` (mêmes filtres que les autres requêtes ;
+    requête minimale pour le selectbox, sans charger les mesures).
+    """
+    if get_db_connection is None:
+        raise RuntimeError("db_utils.get_db_connection introuvable/import impossible.")
+
+    conn, cursor = get_db_connection()
+    try:
+        cursor.execute(
+            f"SELECT DISTINCT participant_id FROM {PERCEPTION_TABLE} "
+            f"WHERE {_VALID_ROWS} ORDER BY participant_id;"
+        )
+        rows = cursor.fetchall()
+    finally:
+        try: cursor.close()
+        except Exception: pass
+        try: conn.close()
+        except Exception: pass
+
+    return [row[0] for row in rows]
+
+
+@st.cache_resource(show_spinner=False, ttl=SNAPSHOT_TTL)
+def load_participant_perception(participant_id) -> pd.DataFrame:
+    """
+    Charge les lignes d'un participant de la table MySQL 'perception'
+    et prépare les colonnes nécessaires.
+
+    Filtre, exclusion des lignes incomplètes et tri sont faits par MySQL
+    (PARTICIPANT_SQL) : seules les colonnes utiles des mesures du
+    participant affiché sont transférées, et le résultat est mis en cache
+    par participant.
+
+    Ajouts :
+    - `velocity_ms` : conversion km/h → m/s
+    - `real_time`   : distance réelle / vitesse
+    - `perceived_time` : distance perçue / vitesse
+
+    Le cache empêche Streamlit de recharger la base à chaque interaction.
+    st.cache_resource partage le DataFrame entre sessions sans le
+    désérialiser à chaque rerun (ne pas le modifier en place).
+    """
+
+    if get_db_connection is None:
+        raise RuntimeError("db_utils.get_db_connection introuvable/import impossible.")
+
+    conn, cursor = get_db_connection()
+    try:
+        cursor.execute(PARTICIPANT_SQL, (participant_id,))
+        cols = [c[0] for c in cursor.description]
+        rows = cursor.fetchall()
+    finally:
+        # Fermeture propre
+        try: cursor.close()
+        except Exception: pass
+        try: conn.close()
+        except Exception: pass
+
+    # Colonnes typées (lignes incomplètes et vitesses nulles déjà exclues par MySQL)
+    df = typed_frame(cols, rows, PARTICIPANT_DTYPES)
+
+    # Colonnes dérivées, sur tableaux NumPy bruts
+    vms = df["velocity_id"].to_numpy() * (5.0 / 18.0)
+    return df.assign(
+        velocity_ms=vms,
+        real_time=df["distance_id"].to_numpy() / vms,
+        perceived_time=df["perceived_distance"].to_numpy() / vms,
+    )
+
+
+def segment_moments(df: pd.DataFrame, keys: list, mean: str, m2: str) -> pd.DataFrame:
+    """
+    Combine les statistiques n / `mean` / `m2` (somme des carrés des écarts
+    à la moyenne) des lignes de `df` par combinaison de `keys`, clés triées.
+    Retourne un DataFrame indexé par `keys` avec les colonnes n, mean, m2.
+
+    Formule de variance parallèle (Chan et al.) : M2 = Σ M2_i + Σ n_i (m_i - m)²,
+    m étant la moyenne du segment. Aucun terme ne se soustrait à un autre :
+    pas de perte de précision quand l'écart-type est petit devant la moyenne.
+    Des mesures brutes se combinent de même avec n = 1 et m2 = 0.
+
+    Implémentation NumPy : codes entiers par clé, tri lexicographique,
+    puis np.add.reduceat sur les segments contigus.
+    Les lignes dont une clé est manquante sont ignorées, comme dans groupby.
+    """
+    codes, levels = [], []
+    for k in keys:
+        c, u = pd.factorize(df[k], sort=True)
+        codes.append(c)
+        levels.append(u)
+    codes = np.vstack(codes)
+
+    keep = (codes >= 0).all(axis=0)
+    if not keep.any():
+        empty = pd.MultiIndex.from_arrays([df[k].iloc[:0] for k in keys], names=keys)
+        return pd.DataFrame({"n": [], "mean": [], "m2": []}, index=empty)
+
+    rows = np.flatnonzero(keep)
+    order = np.lexsort(codes[:, rows][::-1])
+    rows = rows[order]
+    codes = codes[:, rows]
+
+    # Début de chaque segment : première ligne ou changement d'une des clés
+    starts = np.r_[0, np.flatnonzero((np.diff(codes, axis=1) != 0).any(axis=0)) + 1]
+    segment = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, len(rows)]))
+
+    n_i = df["n"].to_numpy()[rows]
+    mean_i = df[mean].to_numpy()[rows]
+    n = np.add.reduceat(n_i, starts)
+    m = np.add.reduceat(n_i * mean_i, starts) / n
+
+    # Écart de chaque moyenne partielle à la moyenne de son segment
+    dev = mean_i - m[segment]
+    m2_total = np.add.reduceat(df[m2].to_numpy()[rows] + n_i * dev * dev, starts)
+
+    index = pd.MultiIndex.from_arrays(
+        [lv.take(cd[starts]) for lv, cd in zip(levels, codes)], names=keys
+    )
+    return pd.DataFrame({"n": n, "mean": m, "m2": m2_total}, index=index)
+
+
+def mean_std(grouped: pd.DataFrame) -> Tuple[pd.Series, pd.Series]:
+    """
+    Moyenne et écart-type (échantillon, ddof=1) d'un résultat de
+    segment_moments. Écart-type NaN si n < 2, comme pandas.
+    """
+    n = grouped["n"]
+    var = (grouped["m2"] / (n - 1)).where(n > 1)
+    return grouped["mean"], np.sqrt(var)
@@ -13,14 +13,15 @@ Objectif :
 Logique :
 - On filtre la météo = "clear" pour calculer les *moyennes* (comme dans la version Dash d’origine).
 - Les barres d’erreur utilisent *toutes* les conditions météo, mais restent alignées sur la moyenne "clear".
-- Les données proviennent de la table MySQL `perception`.
+- Les données proviennent de la table MySQL `perception`, agrégée côté serveur
+  (effectif / somme / somme des carrés par vitesse, météo et distance).
 
 Dépendances :
     pip install streamlit plotly pandas numpy mysql-connector-python
 """
 
 from pathlib import Path
-from typing import Dict, Tuple
+from typing import Dict
 
 import numpy as np
 import pandas as pd
@@ -28,20 +29,11 @@ import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import streamlit as st
 
-# Import flexible : permet au module d'être importé dans Streamlit Cloud
-# même si db_utils n'existe pas encore au moment du build
-try:
-    from db_utils import get_db_connection
-except Exception:
-    get_db_connection = None
-
-# Définition des groupes de vitesse utilisés pour catégoriser l’expérience
-# Les valeurs correspondent aux vitesses en km/h présentes dans la base VR
-VELOCITY_GROUPS: Dict[str, Tuple[float, float]] = {
-    "low": (20.0, 30.0),
-    "medium": (40.0, 50.0),
-    "high": (60.0, 70.0),
-}
+# Chargement et agrégation partagés avec les autres pages de perception
+from ._perception_loader import WEATHER_ORDER, load_perception_df, mean_std, segment_moments
+
+# Figures conservées dans la session (cache LRU commun aux pages)
+from ._figure_cache import cached_figure
 
 # Couleurs par groupe de vitesse (mêmes que dans la version Dash)
 COLOR_MAP = {"low": "#1f77b4", "medium": "#2ca02c", "high": "#d62728"}
@@ -51,72 +43,38 @@ COLOR_MAP = {"low": "#1f77b4", "medium": "#2ca02c", "high": "#d62728"}
 OFFSETS = {"clear": -0.1, "rain": 0.0, "night": 0.1}
 
 
-def categorize_velocity(v: float) -> str:
+def _clear_only(s: pd.Series) -> pd.Series:
     """
-    Associe une vitesse (km/h) à un groupe ('low', 'medium', 'high').
-
-    Remarque :
-    - Dans les données VR, velocity_id contient les vitesses exactes : 20/30/40/50/60/70.
-    - On retourne "unknown" si la valeur ne correspond pas à un intervalle connu.
+    Tranche météo "clear" d'une série indexée par (..., weather_id).
     """
-    for g, (a, b) in VELOCITY_GROUPS.items():
-        if v in (a, b):
-            return g
-    return "unknown"
+    if "clear" not in s.index.get_level_values("weather_id"):
+        return s.iloc[:0].droplevel("weather_id")
+    return s.xs("clear", level="weather_id")
 
 
-@st.cache_data(show_spinner=False)
-def load_perception_df() -> pd.DataFrame:
+def _error_points(std_by_key: dict, mean_idx: pd.Series, group, x_col: str, std_col: str,
+                  offsets: Dict[str, float], labels: Dict[str, str]):
     """
-    Charge la table `perception` depuis MySQL et prépare les colonnes nécessaires.
-
-    Transformations effectuées :
-    - Conversion velocity_id → m/s
-    - Calcul du temps réel et temps perçu
-    - Catégorisation de la vitesse (low/medium/high)
-    - Tri pour un rendu graphique cohérent avec la version originale
+    Points des barres d'erreur d'un groupe de vitesse, toutes météos confondues.
 
-    Le cache est important : évite de recharger la base à chaque interaction Streamlit.
+    Pour chaque météo (ordre WEATHER_ORDER) : abscisses décalées de l'offset
+    météo, ordonnées = moyenne "clear" à la même abscisse, écarts-types.
+    Retourne (x, y, err, libellés météo), concaténés en une seule trace.
     """
-
-    if get_db_connection is None:
-        raise RuntimeError("db_utils.get_db_connection introuvable/import impossible.")
-
-    conn, cursor = get_db_connection()
-    try:
-        cursor.execute("SELECT * FROM perception;")
-        cols = [c[0] for c in cursor.description]
-        rows = cursor.fetchall()
-    finally:
-        # Toujours fermer proprement la connexion MySQL
-        try: cursor.close()
-        except Exception: pass
-        try: conn.close()
-        except Exception: pass
-
-    df = pd.DataFrame(rows, columns=cols).dropna()
-
-    if df.empty:
-        return df
-
-    # Conversion de la vitesse → m/s (velocity_id = km/h)
-    df["velocity_id"] = pd.to_numeric(df["velocity_id"], errors="coerce")
-    df["velocity_ms"] = df["velocity_id"] * (5.0 / 18.0)
-
-    # Suppression des vitesses nulles ou invalides
-    df = df[df["velocity_ms"].replace(0, np.nan).notna()].copy()
-
-    # Calcul du temps réel/perçu selon distance / vitesse
-    df["real_time"] = df["distance_id"] / df["velocity_ms"]
-    df["perceived_time"] = df["perceived_distance"] / df["velocity_ms"]
-
-    # Catégorisation des vitesses
-    df["velocity_group"] = df["velocity_id"].apply(categorize_velocity)
-
-    # Tri pour respecter l'ordre des vitesses/météos/distances comme l'original
-    df = df.sort_values(by=["velocity_id", "weather_id", "distance_id"])
-
-    return df
+    xs, ys, errs, names = [], [], [], []
+    for weather in WEATHER_ORDER:
+        std = std_by_key.get((group, weather))
+        if std is None:
+            continue
+        x = std[x_col].to_numpy()
+        xs.append(x + offsets[weather])
+        ys.append(mean_idx.loc[group].reindex(x).to_numpy())
+        errs.append(std[std_col].to_numpy())
+        names.extend([labels[weather]] * len(x))
+
+    if not xs:
+        return np.empty(0), np.empty(0), np.empty(0), names
+    return np.concatenate(xs), np.concatenate(ys), np.concatenate(errs), names
 
 
 def build_figure(df: pd.DataFrame) -> go.Figure:
@@ -129,51 +87,67 @@ def build_figure(df: pd.DataFrame) -> go.Figure:
     - On ajoute des offsets horizontaux pour distinguer les erreurs selon "clear/rain/night".
     """
 
-    # Filtrer "clear" pour les moyennes (réplicant l’ancienne figure Python)
-    df_clear = df[df["weather_id"] == "clear"].copy()
+    # Une seule agrégation par axe (distance / temps réel), toutes météos :
+    # les écarts-types par météo en sortent directement, et les moyennes
+    # "clear" sont une tranche du résultat (pas un second groupby).
+    stats_d = segment_moments(df, ["distance_id", "velocity_group", "weather_id"], "mean_pd", "m2_pd")
+    mean_pd, std_pd = mean_std(stats_d)
 
-    # Moyennes distance perçue par distance et groupe de vitesse
-    df_mean_distance = (
-        df_clear.groupby(["distance_id", "velocity_group"])  # type: ignore
-        ["perceived_distance"].mean().reset_index(name="mean_perceived_distance")
-    )
+    stats_t = segment_moments(df, ["real_time", "velocity_group", "weather_id"], "mean_pt", "m2_pt")
+    mean_pt, std_pt = mean_std(stats_t)
+
+    # Moyennes distance perçue par distance et groupe de vitesse ("clear")
+    df_mean_distance = _clear_only(mean_pd).reset_index(name="mean_perceived_distance")
 
     # Écarts-types par météo pour distance perçue
-    weather_std_distance = (
-        df.groupby(["distance_id", "velocity_group", "weather_id"])  # type: ignore
-        ["perceived_distance"].std().reset_index(name="std_perceived_distance")
-    )
+    weather_std_distance = std_pd.reset_index(name="std_perceived_distance")
 
-    # Moyennes temps perçu par temps réel et groupe de vitesse
-    df_mean_time = (
-        df_clear.groupby(["real_time", "velocity_group"])  # type: ignore
-        ["perceived_time"].mean().reset_index(name="mean_perceived_time")
-    )
+    # Moyennes temps perçu par temps réel et groupe de vitesse ("clear")
+    df_mean_time = _clear_only(mean_pt).reset_index(name="mean_perceived_time")
 
     # Écarts-types par météo pour temps perçu
-    weather_std_time = (
-        df.groupby(["real_time", "velocity_group", "weather_id"])  # type: ignore
-        ["perceived_time"].std().reset_index(name="std_perceived_time")
-    )
+    weather_std_time = std_pt.reset_index(name="std_perceived_time")
+
+    # Moyennes indexées (groupe, x) : les barres d'erreur retrouvent leur
+    # ordonnée par une jointure hachée (reindex) au lieu d'un isin par trace
+    mean_d_idx = df_mean_distance.set_index(["velocity_group", "distance_id"])["mean_perceived_distance"]
+    mean_t_idx = df_mean_time.set_index(["velocity_group", "real_time"])["mean_perceived_time"]
+
+    # Écarts-types découpés une seule fois par (groupe, météo)
+    std_d_by_key = dict(list(weather_std_distance.groupby(["velocity_group", "weather_id"], observed=True, sort=False)))
+    std_t_by_key = dict(list(weather_std_time.groupby(["velocity_group", "weather_id"], observed=True, sort=False)))
 
     # Figure avec deux sous-graphiques empilés
     fig = make_subplots(rows=2, cols=1, shared_xaxes=False, vertical_spacing=0.12)
 
+    # Groupes dans l'ordre des catégories (low < medium < high < unknown),
+    # limités à ceux qui ont une moyenne "clear" : aucun parcours des lignes
+    present = set(mean_d_idx.index.remove_unused_levels().levels[0])
+    groups = [g for g in df["velocity_group"].cat.categories if g in present]
+
+    # Couleur / libellé par groupe et décalage / libellé par météo,
+    # calculés une fois au lieu d'être relus à chaque trace
+    group_meta = {g: (COLOR_MAP.get(str(g), "#444"), str(g).capitalize()) for g in groups}
+    w_offset_d = {w: OFFSETS.get(w, 0.0) for w in WEATHER_ORDER}
+    w_offset_t = {w: off / 10.0 for w, off in w_offset_d.items()}
+    w_label = {w: w.capitalize() for w in WEATHER_ORDER}
+
     # Pour chaque groupe de vitesse : tracer les moyennes + barres d’erreurs
-    for group in df_mean_distance["velocity_group"].dropna().unique():
+    for group in groups:
+        color, label = group_meta[group]
 
         # -----------------------------
         # 1) Distance perçue (rangée 2)
         # -----------------------------
         mean_d = df_mean_distance[df_mean_distance["velocity_group"] == group]
         fig.add_trace(
-            go.Scatter(
+            go.Scattergl(
                 x=mean_d["distance_id"],
                 y=mean_d["mean_perceived_distance"],
                 mode="markers+lines",
-                name=f"{str(group).capitalize()} Speed",
-                marker=dict(color=COLOR_MAP.get(str(group), "#444"), size=8),
-                line=dict(color=COLOR_MAP.get(str(group), "#444"), width=2),
+                name=f"{label} Speed",
+                marker=dict(color=color, size=8),
+                line=dict(color=color, width=2),
                 legendgroup=str(group),
             ),
             row=2, col=1,
@@ -184,13 +158,13 @@ def build_figure(df: pd.DataFrame) -> go.Figure:
         # -----------------------------
         mean_t = df_mean_time[df_mean_time["velocity_group"] == group]
         fig.add_trace(
-            go.Scatter(
+            go.Scattergl(
                 x=mean_t["real_time"],
                 y=mean_t["mean_perceived_time"],
                 mode="markers+lines",
-                name=f"{str(group).capitalize()} Speed",
-                marker=dict(color=COLOR_MAP.get(str(group), "#444"), size=8),
-                line=dict(color=COLOR_MAP.get(str(group), "#444"), width=2),
+                name=f"{label} Speed",
+                marker=dict(color=color, size=8),
+                line=dict(color=color, width=2),
                 legendgroup=str(group),
                 showlegend=False,   # éviter double affichage dans la légende
             ),
@@ -198,71 +172,63 @@ def build_figure(df: pd.DataFrame) -> go.Figure:
         )
 
         # -----------------------------
-        # 3) Barres d’erreurs par météo
+        # 3) Barres d’erreurs, toutes météos dans une trace par panneau
         # -----------------------------
-        for weather in ["clear", "rain", "night"]:
-
-            # Distance
-            std_d = weather_std_distance[
-                (weather_std_distance["velocity_group"] == group) &
-                (weather_std_distance["weather_id"] == weather)
-            ]
-            if not std_d.empty:
-                fig.add_trace(
-                    go.Scatter(
-                        x=std_d["distance_id"] + OFFSETS.get(weather, 0.0),
-                        y=mean_d[mean_d["distance_id"].isin(std_d["distance_id"])]["mean_perceived_distance"],
-                        mode="markers",
-                        marker=dict(color=COLOR_MAP.get(str(group), "#444"),
-                                    size=8, opacity=0),  # marqueur invisible → seulement barres d’erreur
-                        error_y=dict(type="data", array=std_d["std_perceived_distance"], visible=True),
-                        legendgroup=str(group),
-                        showlegend=False,
-                        hoverinfo="x+y+name+text",
-                        customdata=[weather.capitalize()] * len(std_d),
-                        hovertemplate=(
-                            "Weather: %{customdata}<br>"
-                            "Distance: %{x}<br>"
-                            "Mean Perceived Distance: %{y}<br>"
-                            "Error: %{error_y.array}<br>"
-                        ),
+        x_d, y_d, err_d, w_d = _error_points(std_d_by_key, mean_d_idx, group, "distance_id", "std_perceived_distance", w_offset_d, w_label)
+        if len(x_d):
+            fig.add_trace(
+                go.Scattergl(
+                    x=x_d,
+                    y=y_d,
+                    mode="lines",
+                    line=dict(color=color, width=0),  # ni ligne ni marqueur → seulement barres d’erreur
+                    error_y=dict(type="data", array=err_d, visible=True, color=color),
+                    legendgroup=str(group),
+                    showlegend=False,
+                    hoverinfo="x+y+name+text",
+                    customdata=w_d,
+                    hovertemplate=(
+                        "Weather: %{customdata}<br>"
+                        "Distance: %{x}<br>"
+                        "Mean Perceived Distance: %{y}<br>"
+                        "Error: %{error_y.array}<br>"
                     ),
-                    row=2, col=1,
-                )
-
-            # Temps réel / perçu
-            std_t = weather_std_time[
-                (weather_std_time["velocity_group"] == group) &
-                (weather_std_time["weather_id"] == weather)
-            ]
-            if not std_t.empty:
-                fig.add_trace(
-                    go.Scatter(
-                        x=std_t["real_time"] + (OFFSETS.get(weather, 0.0) / 10.0),
-                        y=mean_t[mean_t["real_time"].isin(std_t["real_time"])]["mean_perceived_time"],
-                        mode="markers",
-                        marker=dict(color=COLOR_MAP.get(str(group), "#444"),
-                                    size=8, opacity=0),
-                        error_y=dict(type="data", array=std_t["std_perceived_time"], visible=True),
-                        legendgroup=str(group),
-                        showlegend=False,
-                        hoverinfo="x+y+name+text",
-                        customdata=[weather.capitalize()] * len(std_t),
-                        hovertemplate=(
-                            "Weather: %{customdata}<br>"
-                            "Real Time: %{x}<br>"
-                            "Mean Perceived Time: %{y}<br>"
-                            "Error: %{error_y.array}<br>"
-                        ),
+                ),
+                row=2, col=1,
+            )
+
+        # Temps réel / perçu
+        x_t, y_t, err_t, w_t = _error_points(std_t_by_key, mean_t_idx, group, "real_time", "std_perceived_time", w_offset_t, w_label)
+        if len(x_t):
+            fig.add_trace(
+                go.Scattergl(
+                    x=x_t,
+                    y=y_t,
+                    mode="lines",
+                    line=dict(color=color, width=0),
+                    error_y=dict(type="data", array=err_t, visible=True, color=color),
+                    legendgroup=str(group),
+                    showlegend=False,
+                    hoverinfo="x+y+name+text",
+                    customdata=w_t,
+                    hovertemplate=(
+                        "Weather: %{customdata}<br>"
+                        "Real Time: %{x}<br>"
+                        "Mean Perceived Time: %{y}<br>"
+                        "Error: %{error_y.array}<br>"
                     ),
-                    row=1, col=1,
-                )
+                ),
+                row=1, col=1,
+            )
 
     # -----------------------------
     # Ajout des lignes de baseline y = x
     # -----------------------------
-    if not df_clear.empty:
-        dmin, dmax = float(df_clear["distance_id"].min()), float(df_clear["distance_id"].max())
+    # Bornes lues sur les moyennes "clear" agrégées (mêmes x que les lignes
+    # "clear" de df, sans masque ni parcours de df)
+    # Restent en SVG (go.Scatter) : 2 points chacune, pas besoin de WebGL
+    if not df_mean_distance.empty:
+        dmin, dmax = float(df_mean_distance["distance_id"].min()), float(df_mean_distance["distance_id"].max())
         fig.add_trace(
             go.Scatter(x=[dmin, dmax], y=[dmin, dmax],
                        mode="lines", line=dict(color="grey", dash="dash"),
@@ -270,7 +236,7 @@ def build_figure(df: pd.DataFrame) -> go.Figure:
             row=2, col=1,
         )
 
-        tmin, tmax = float(df_clear["real_time"].min()), float(df_clear["real_time"].max())
+        tmin, tmax = float(df_mean_time["real_time"].min()), float(df_mean_time["real_time"].max())
         fig.add_trace(
             go.Scatter(x=[tmin, tmax], y=[tmin, tmax],
                        mode="lines", line=dict(color="grey", dash="dash"),
@@ -325,6 +291,7 @@ def render(base_path: Path) -> None:
         st.info("Aucune donnée trouvée dans la table Perception.")
         return
 
-    # Construction et affichage de la figure
-    fig = build_figure(df)
+    # Construction et affichage de la figure, reconstruite seulement quand
+    # load_perception_df() renvoie un nouvel objet
+    fig = cached_figure((__name__,), df, lambda: build_figure(df))
     st.plotly_chart(fig, use_container_width=True)
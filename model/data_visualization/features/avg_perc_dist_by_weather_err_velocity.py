@@ -11,9 +11,12 @@ Objectif :
     (2) Distance réelle vs distance perçue
 
 Principe :
-- On regroupe les données par météo pour calculer les moyennes.
+- Les données proviennent de la table MySQL `perception`, agrégée côté serveur
+  (effectif / somme / somme des carrés par vitesse, météo et distance).
+- On regroupe ces statistiques par météo pour calculer les moyennes.
 - On regroupe par (météo × groupe de vitesse) pour les écarts-type (barres d’erreur).
 - Les décalages horizontaux permettent de séparer visuellement les erreurs selon les vitesses.
+- Courbes et barres d’erreur en WebGL (go.Scattergl).
 - Reproduction fidèle de la logique utilisée dans la version Dash/Matplotlib.
 
 Dépendances :
@@ -21,7 +24,7 @@ Dépendances :
 """
 
 from pathlib import Path
-from typing import Dict, Tuple
+from typing import Dict
 
 import numpy as np
 import pandas as pd
@@ -29,18 +32,12 @@ import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import streamlit as st
 
-# Import flexible du connecteur MySQL (utile pour Streamlit Cloud)
-try:
-    from db_utils import get_db_connection
-except Exception:
-    get_db_connection = None
-
-# Définition des groupes de vitesse (km/h) utilisés pour catégoriser les essais
-VELOCITY_GROUPS: Dict[str, Tuple[float, float]] = {
-    "low": (20.0, 30.0),
-    "medium": (40.0, 50.0),
-    "high": (60.0, 70.0),
-}
+# Chargement et agrégation partagés avec les autres pages de perception
+# (statistiques par cellule vitesse × météo × distance, calculées par MySQL)
+from ._perception_loader import SNAPSHOT_TTL, load_perception_df, mean_std, segment_moments
+
+# Figures conservées dans la session (cache LRU commun aux pages)
+from ._figure_cache import cached_figure
 
 # Couleurs associées à la météo (comme dans la version originale)
 WEATHER_COLOR = {
@@ -53,72 +50,61 @@ WEATHER_COLOR = {
 VELOCITY_OFFSETS = {"low": -0.1, "medium": 0.0, "high": 0.1}
 
 
-def categorize_velocity(v: float) -> str:
-    """
-    Classe une vitesse (km/h) dans un groupe (low / medium / high).
-    Retourne 'unknown' si la vitesse ne correspond pas aux intervalles.
+def summarize(df: pd.DataFrame) -> Dict[str, pd.DataFrame]:
     """
-    for g, (a, b) in VELOCITY_GROUPS.items():
-        if v in (a, b):
-            return g
-    return "unknown"
+    Tables agrégées utilisées par la figure, calculées depuis les
+    statistiques par cellule de load_perception_df() :
 
-
-@st.cache_data(show_spinner=False)
-def load_perception_df() -> pd.DataFrame:
+    - mean_dist / mean_time : moyennes par (x, météo)
+    - err_dist / err_time   : écarts-types par (x, vitesse, météo),
+      avec la moyenne météo au même x (ordonnée des barres d'erreur)
     """
-    Charge la table MySQL `perception` et prépare les colonnes nécessaires :
-
-    - conversion de la vitesse de km/h → m/s
-    - calcul du temps réel (distance / vitesse)
-    - calcul du temps perçu (distance perçue / vitesse)
-    - création de la colonne de groupes de vitesse (velocity_group)
-    - tri des lignes pour reproduire l'ordre de l'expérience VR
 
-    Le cache Streamlit évite un rechargement systématique de la base.
-    """
-
-    if get_db_connection is None:
-        raise RuntimeError("db_utils.get_db_connection introuvable/import impossible.")
-
-    # Connexion MySQL
-    conn, cursor = get_db_connection()
-    try:
-        cursor.execute("SELECT * FROM perception;")
-        cols = [c[0] for c in cursor.description]
-        rows = cursor.fetchall()
-    finally:
-        # Fermeture sécurisée
-        try: cursor.close()
-        except Exception: pass
-        try: conn.close()
-        except Exception: pass
+    # -------------------------
+    #  Une agrégation par axe (distance / temps réel)
+    # -------------------------
+    # Combinaison des statistiques par cellule (voir _perception_loader) par
+    # (x, vitesse, météo) : les écarts-types en sortent directement, et les
+    # moyennes par météo recombinent ce petit résultat (pas de second passage).
+    stats_d = segment_moments(df, ["distance_id", "velocity_group", "weather_id"], "mean_pd", "m2_pd")
+    stats_t = segment_moments(df, ["real_time", "velocity_group", "weather_id"], "mean_pt", "m2_pt")
 
-    df = pd.DataFrame(rows, columns=cols).dropna()
-    if df.empty:
-        return df
+    # -------------------------
+    #  MOYENNES par météo
+    # -------------------------
+    by_weather = segment_moments(stats_d.reset_index(), ["distance_id", "weather_id"], "mean", "m2")
+    mean_dist = by_weather["mean"].reset_index(name="mean_perceived_distance")
 
-    # Conversion vitesse → m/s
-    df["velocity_id"] = pd.to_numeric(df["velocity_id"], errors="coerce")
-    df["velocity_ms"] = df["velocity_id"] * (5.0 / 18.0)
+    by_weather = segment_moments(stats_t.reset_index(), ["real_time", "weather_id"], "mean", "m2")
+    mean_time = by_weather["mean"].reset_index(name="mean_perceived_time")
 
-    # Suppression des vitesses nulles/invalides
-    df = df[df["velocity_ms"].replace(0, np.nan).notna()].copy()
+    # -------------------------
+    #  ÉCARTS-TYPE par météo × vitesse
+    # -------------------------
+    std_dist = mean_std(stats_d)[1].reset_index(name="std_perceived_distance")
+    std_time = mean_std(stats_t)[1].reset_index(name="std_perceived_time")
 
-    # Calcul des temps réel/perçu
-    df["real_time"] = df["distance_id"] / df["velocity_ms"]
-    df["perceived_time"] = df["perceived_distance"] / df["velocity_ms"]
+    # Ordonnée des barres d'erreur = moyenne météo au même x : une jointure
+    # hachée unique (au lieu d'un isin par météo × vitesse, qui supposait
+    # en plus que les deux tables étaient alignées ligne à ligne)
+    err_dist = std_dist.merge(mean_dist, on=["distance_id", "weather_id"], how="left")
+    err_time = std_time.merge(mean_time, on=["real_time", "weather_id"], how="left")
 
-    # Création du groupe de vitesse
-    df["velocity_group"] = df["velocity_id"].apply(categorize_velocity)
+    return {"mean_dist": mean_dist, "mean_time": mean_time, "err_dist": err_dist, "err_time": err_time}
 
-    # Tri pour cohérence avec la version Dash/Python originale
-    df = df.sort_values(by=["velocity_id", "weather_id", "distance_id"])
 
-    return df
+@st.cache_resource(show_spinner=False, ttl=SNAPSHOT_TTL)
+def load_summary() -> Dict[str, pd.DataFrame]:
+    """
+    Résumé agrégé (voir summarize), calculé une fois et partagé par toutes
+    les sessions : les reruns ne refont aucune agrégation.
+    Dictionnaire vide si la table est vide.
+    """
+    df = load_perception_df()
+    return summarize(df) if not df.empty else {}
 
 
-def build_figure(df: pd.DataFrame) -> go.Figure:
+def build_figure(summary: Dict[str, pd.DataFrame]) -> go.Figure:
     """
     Construit la figure Plotly à deux panneaux :
 
@@ -131,48 +117,34 @@ def build_figure(df: pd.DataFrame) -> go.Figure:
 
     Les barres d'erreur sont légèrement décalées horizontalement
     → permet de visualiser simultanément l'influence de la vitesse.
-    """
-
-    # -------------------------
-    #  MOYENNES par météo
-    # -------------------------
-    mean_dist = (
-        df.groupby(["distance_id", "weather_id"])["perceived_distance"]
-        .mean()
-        .reset_index(name="mean_perceived_distance")
-    )
-
-    mean_time = (
-        df.groupby(["real_time", "weather_id"])["perceived_time"]
-        .mean()
-        .reset_index(name="mean_perceived_time")
-    )
 
-    # -------------------------
-    #  ÉCARTS-TYPE par météo × vitesse
-    # -------------------------
-    std_dist = (
-        df.groupby(["distance_id", "velocity_group", "weather_id"])
-        ["perceived_distance"].std().reset_index(name="std_perceived_distance")
-    )
+    `summary` provient de load_summary() : la figure ne fait que découper
+    ces petites tables.
+    """
+    mean_dist, mean_time = summary["mean_dist"], summary["mean_time"]
+    err_dist, err_time = summary["err_dist"], summary["err_time"]
 
-    std_time = (
-        df.groupby(["real_time", "velocity_group", "weather_id"])
-        ["perceived_time"].std().reset_index(name="std_perceived_time")
-    )
+    # Découpage en un seul passage par table (au lieu d'un masque booléen
+    # par météo et par vitesse dans la boucle)
+    mean_time_by_w = dict(list(mean_time.groupby("weather_id", observed=True, sort=False)))
+    std_dist_by_key = dict(list(err_dist.groupby(["weather_id", "velocity_group"], observed=True, sort=False)))
+    std_time_by_key = dict(list(err_time.groupby(["weather_id", "velocity_group"], observed=True, sort=False)))
 
-    # Figure avec 2 sous-graphiques (temps / distance)
-    fig = make_subplots(rows=2, cols=1, shared_xaxes=False, vertical_spacing=0.12)
+    # Traces accumulées en dictionnaires bruts puis passées en une fois au
+    # constructeur de la figure (pas de add_trace, qui revalide et recopie
+    # la liste des traces à chaque appel). Rangée 1 = axes x/y (temps),
+    # rangée 2 = axes x2/y2 (distance).
+    traces = []
 
-    # Boucle sur les conditions météo
-    for weather in mean_dist["weather_id"].dropna().unique():
+    # Boucle sur les conditions météo (ordre des catégories : clear, rain, night)
+    for weather, d_mean in mean_dist.groupby("weather_id", observed=True):
 
         # -------------------------
         #   DISTANCE (rangée 2)
         # -------------------------
-        d_mean = mean_dist[mean_dist["weather_id"] == weather]
-        fig.add_trace(
-            go.Scatter(
+        traces.append(
+            dict(
+                type="scattergl",
                 x=d_mean["distance_id"],
                 y=d_mean["mean_perceived_distance"],
                 mode="markers+lines",
@@ -180,16 +152,17 @@ def build_figure(df: pd.DataFrame) -> go.Figure:
                 marker=dict(color=WEATHER_COLOR.get(weather, "#444"), size=8),
                 line=dict(color=WEATHER_COLOR.get(weather, "#444"), width=2),
                 legendgroup=weather,
+                xaxis="x2", yaxis="y2",
             ),
-            row=2, col=1,
         )
 
         # -------------------------
         #   TEMPS (rangée 1)
         # -------------------------
-        t_mean = mean_time[mean_time["weather_id"] == weather]
-        fig.add_trace(
-            go.Scatter(
+        t_mean = mean_time_by_w[weather]
+        traces.append(
+            dict(
+                type="scattergl",
                 x=t_mean["real_time"],
                 y=t_mean["mean_perceived_time"],
                 mode="markers+lines",
@@ -198,87 +171,112 @@ def build_figure(df: pd.DataFrame) -> go.Figure:
                 line=dict(color=WEATHER_COLOR.get(weather, "#444"), width=2),
                 legendgroup=weather,
                 showlegend=False,  # on n'affiche qu'une légende par météo
+                xaxis="x", yaxis="y",
             ),
-            row=1, col=1,
         )
 
         # -------------------------
         #   BARRES D’ERREUR (météo × vitesse)
         # -------------------------
+        # Les trois groupes de vitesse sont concaténés : une seule trace
+        # d'erreurs par météo et par panneau, sans marqueur invisible
+        x_d, y_d, err_d, v_d = [], [], [], []
+        x_t, y_t, err_t, v_t = [], [], [], []
         for vcat in ["low", "medium", "high"]:
 
             # --- Distance ---
-            d_std = std_dist[(std_dist["weather_id"] == weather) & (std_dist["velocity_group"] == vcat)]
-            if not d_std.empty:
-                fig.add_trace(
-                    go.Scatter(
-                        x=d_std["distance_id"] + VELOCITY_OFFSETS.get(vcat, 0.0),
-                        y=d_mean[d_mean["distance_id"].isin(d_std["distance_id"])]["mean_perceived_distance"],
-                        mode="markers",
-                        marker=dict(color=WEATHER_COLOR.get(weather, "#444"), size=8, opacity=0),
-                        error_y=dict(type="data", array=d_std["std_perceived_distance"], visible=True),
-                        name=f"{vcat.capitalize()} Error",
-                        legendgroup=weather,
-                        showlegend=False,
-                        hoverinfo="x+y+name+text",
-                        customdata=[vcat.capitalize()] * len(d_std),
-                        hovertemplate=(
-                            "Velocity: %{customdata}<br>"
-                            "Distance: %{x}<br>"
-                            "Mean Perceived Distance: %{y}<br>"
-                            "Error: %{error_y.array}<br>"
-                        ),
-                    ),
-                    row=2, col=1,
-                )
+            d_std = std_dist_by_key.get((weather, vcat))
+            if d_std is not None:
+                x_d.append(d_std["distance_id"].to_numpy() + VELOCITY_OFFSETS.get(vcat, 0.0))
+                y_d.append(d_std["mean_perceived_distance"].to_numpy())
+                err_d.append(d_std["std_perceived_distance"].to_numpy())
+                v_d.extend([vcat.capitalize()] * len(d_std))
 
             # --- Temps ---
-            t_std = std_time[(std_time["weather_id"] == weather) & (std_time["velocity_group"] == vcat)]
-            if not t_std.empty:
-                fig.add_trace(
-                    go.Scatter(
-                        x=t_std["real_time"] + (VELOCITY_OFFSETS.get(vcat, 0.0) / 10.0),
-                        y=t_mean[t_mean["real_time"].isin(t_std["real_time"])]["mean_perceived_time"],
-                        mode="markers",
-                        marker=dict(color=WEATHER_COLOR.get(weather, "#444"), size=8, opacity=0),
-                        error_y=dict(type="data", array=t_std["std_perceived_time"], visible=True),
-                        name=f"{vcat.capitalize()} Error",
-                        legendgroup=weather,
-                        showlegend=False,
-                        hoverinfo="x+y+name+text",
-                        customdata=[vcat.capitalize()] * len(t_std),
-                        hovertemplate=(
-                            "Velocity: %{customdata}<br>"
-                            "Real Time: %{x}<br>"
-                            "Mean Perceived Time: %{y}<br>"
-                            "Error: %{error_y.array}<br>"
-                        ),
+            t_std = std_time_by_key.get((weather, vcat))
+            if t_std is not None:
+                x_t.append(t_std["real_time"].to_numpy() + (VELOCITY_OFFSETS.get(vcat, 0.0) / 10.0))
+                y_t.append(t_std["mean_perceived_time"].to_numpy())
+                err_t.append(t_std["std_perceived_time"].to_numpy())
+                v_t.extend([vcat.capitalize()] * len(t_std))
+
+        if x_d:
+            traces.append(
+                dict(
+                    type="scattergl",
+                    x=np.concatenate(x_d),
+                    y=np.concatenate(y_d),
+                    mode="lines",
+                    line=dict(color=WEATHER_COLOR.get(weather, "#444"), width=0),  # seulement barres d’erreur
+                    error_y=dict(type="data", array=np.concatenate(err_d), visible=True,
+                                 color=WEATHER_COLOR.get(weather, "#444")),
+                    name="Velocity Error",
+                    legendgroup=weather,
+                    showlegend=False,
+                    hoverinfo="x+y+name+text",
+                    customdata=v_d,
+                    hovertemplate=(
+                        "Velocity: %{customdata}<br>"
+                        "Distance: %{x}<br>"
+                        "Mean Perceived Distance: %{y}<br>"
+                        "Error: %{error_y.array}<br>"
                     ),
-                    row=1, col=1,
-                )
+                    xaxis="x2", yaxis="y2",
+                ),
+            )
+
+        if x_t:
+            traces.append(
+                dict(
+                    type="scattergl",
+                    x=np.concatenate(x_t),
+                    y=np.concatenate(y_t),
+                    mode="lines",
+                    line=dict(color=WEATHER_COLOR.get(weather, "#444"), width=0),
+                    error_y=dict(type="data", array=np.concatenate(err_t), visible=True,
+                                 color=WEATHER_COLOR.get(weather, "#444")),
+                    name="Velocity Error",
+                    legendgroup=weather,
+                    showlegend=False,
+                    hoverinfo="x+y+name+text",
+                    customdata=v_t,
+                    hovertemplate=(
+                        "Velocity: %{customdata}<br>"
+                        "Real Time: %{x}<br>"
+                        "Mean Perceived Time: %{y}<br>"
+                        "Error: %{error_y.array}<br>"
+                    ),
+                    xaxis="x", yaxis="y",
+                ),
+            )
 
     # -------------------------
     #   Lignes de référence y=x
     # -------------------------
-    if not df.empty:
+    # Restent en SVG (scatter) : 2 points chacune, pas besoin de WebGL
+    # Bornes lues sur les moyennes agrégées (toutes les lignes y contribuent)
+    if not mean_dist.empty:
         # Distance
-        dmin, dmax = float(df["distance_id"].min()), float(df["distance_id"].max())
-        fig.add_trace(
-            go.Scatter(x=[dmin, dmax], y=[dmin, dmax],
-                       mode="lines", line=dict(color="grey", dash="dash"),
-                       showlegend=False),
-            row=2, col=1,
+        dmin, dmax = float(mean_dist["distance_id"].min()), float(mean_dist["distance_id"].max())
+        traces.append(
+            dict(type="scatter", x=[dmin, dmax], y=[dmin, dmax],
+                 mode="lines", line=dict(color="grey", dash="dash"),
+                 showlegend=False, xaxis="x2", yaxis="y2"),
         )
 
         # Temps
-        tmin, tmax = float(df["real_time"].min()), float(df["real_time"].max())
-        fig.add_trace(
-            go.Scatter(x=[tmin, tmax], y=[tmin, tmax],
-                       mode="lines", line=dict(color="grey", dash="dash"),
-                       showlegend=False),
-            row=1, col=1,
+        tmin, tmax = float(mean_time["real_time"].min()), float(mean_time["real_time"].max())
+        traces.append(
+            dict(type="scatter", x=[tmin, tmax], y=[tmin, tmax],
+                 mode="lines", line=dict(color="grey", dash="dash"),
+                 showlegend=False, xaxis="x", yaxis="y"),
         )
 
+    # Figure avec 2 sous-graphiques (temps / distance) : seule la mise en page
+    # de make_subplots est reprise
+    layout = make_subplots(rows=2, cols=1, shared_xaxes=False, vertical_spacing=0.12).layout
+    fig = go.Figure(data=traces, layout=layout)
+
     # -------------------------
     #   Mise en forme générale
     # -------------------------
@@ -314,14 +312,15 @@ def render(base_path: Path) -> None:
     st.subheader("Avg Perceived Distance by Weather (errors by Velocity)")
 
     try:
-        df = load_perception_df()
+        summary = load_summary()
     except Exception as e:
         st.error(f"Erreur de chargement MySQL : {e}")
         return
 
-    if df.empty:
+    if not summary:
         st.info("Aucune donnée trouvée dans la table Perception.")
         return
 
-    fig = build_figure(df)
+    # Figure reconstruite seulement quand load_summary() renvoie un nouvel objet
+    fig = cached_figure((__name__,), summary, lambda: build_figure(summary))
     st.plotly_chart(fig, use_container_width=True)
@@ -11,7 +11,7 @@ Objectif :
 - Les barres affichent la moyenne ± écart-type.
 
 Principe :
-- On calcule le delta directement via un SELECT SQL.
+- On calcule le delta et on l'agrège (moyenne, écart-type) directement en SQL.
 - On agrège par distance_id pour conserver la structure des essais Exp1.
 - On utilise des couleurs cohérentes avec le reste de l’app.
 
@@ -20,7 +20,7 @@ Dépendances :
 """
 
 from pathlib import Path
-from typing import Dict, Tuple
+from typing import Tuple
 
 import numpy as np
 import pandas as pd
@@ -33,6 +33,15 @@ try:
 except Exception:
     get_db_connection = None
 
+# Groupes de vitesse (km/h) et ordre des météos, communs aux pages de perception
+from ._perception_loader import (
+    SNAPSHOT_DIR, SNAPSHOT_TTL, PERCEPTION_TABLE, VELOCITY_GROUPS, WEATHER_ORDER, load_snapshot,
+    typed_frame,
+)
+
+# Figures conservées dans la session (cache LRU commun aux pages)
+from ._figure_cache import cached_figure
+
 # Palette météo (cohérente avec les autres visualisations)
 WEATHER_COLOR = {
     "clear": "#00BFFF",  # bleu clair
@@ -43,61 +52,68 @@ WEATHER_COLOR = {
 # Palette vitesse (mêmes couleurs que velocity groups ailleurs dans l’app)
 VELOCITY_COLOR = {"low": "#1f77b4", "medium": "#2ca02c", "high": "#d62728"}
 
-# Groupes de vitesse (km/h)
-VELOCITY_GROUPS: Dict[str, Tuple[float, float]] = {
-    "low": (20.0, 30.0),
-    "medium": (40.0, 50.0),
-    "high": (60.0, 70.0),
-}
+# Catégories des clés de regroupement : codes entiers dans l'ordre d'affichage
+WEATHER_DTYPE = pd.CategoricalDtype(WEATHER_ORDER)
+VELOCITY_GROUP_DTYPE = pd.CategoricalDtype(list(VELOCITY_GROUPS) + ["unknown"], ordered=True)
 
+# Instantanés parquet des deux agrégats (voir load_snapshot)
+DELTA_BY_WEATHER_SNAPSHOT = SNAPSHOT_DIR / "perception_delta_weather.parquet"
+DELTA_BY_VELOCITY_SNAPSHOT = SNAPSHOT_DIR / "perception_delta_velocity.parquet"
 
-def categorize_velocity(v: float) -> str:
-    """
-    Classe une vitesse précise (ex : 20, 30, 40 km/h) dans un groupe low/medium/high.
 
-    - Les intervalles sont définis dans VELOCITY_GROUPS.
-    - Si une vitesse ne correspond pas : retourne "unknown".
+def _velocity_group_case() -> str:
     """
-    for g, (a, b) in VELOCITY_GROUPS.items():
-        if v in (a, b):
-            return g
-    return "unknown"
+    Expression SQL CASE équivalente au classement low / medium / high
+    de VELOCITY_GROUPS ("unknown" si la vitesse ne correspond pas).
+    """
+    whens = " ".join(
+        f"WHEN velocity_id IN ({a:g}, {b:g}) THEN '{g}'"
+        for g, (a, b) in VELOCITY_GROUPS.items()
+    )
+    return f"CASE {whens} ELSE 'unknown' END"
+
+
+# Filtre commun : lignes complètes uniquement (équivalent du dropna d'origine)
+_DELTA_WHERE = """WHERE participant_id IS NOT NULL
+      AND perceived_distance IS NOT NULL
+      AND weather_id IS NOT NULL
+      AND velocity_id IS NOT NULL
+      AND distance_id IS NOT NULL"""
+
+# Delta moyen ± écart-type (échantillon) par météo et distance
+DELTA_BY_WEATHER_SQL = f"""
+    SELECT weather_id, distance_id,
+           AVG(perceived_distance - distance_id) AS mean,
+           STDDEV_SAMP(perceived_distance - distance_id) AS std
+    FROM {PERCEPTION_TABLE}
+    {_DELTA_WHERE}
+    GROUP BY weather_id, distance_id;
+"""
+
+# Delta moyen ± écart-type (échantillon) par groupe de vitesse et distance
+DELTA_BY_VELOCITY_SQL = f"""
+    SELECT {_velocity_group_case()} AS velocity_group, distance_id,
+           AVG(perceived_distance - distance_id) AS mean,
+           STDDEV_SAMP(perceived_distance - distance_id) AS std
+    FROM {PERCEPTION_TABLE}
+    {_DELTA_WHERE}
+    GROUP BY velocity_group, distance_id;
+"""
 
 
-@st.cache_data(show_spinner=False)
-def load_delta_df() -> pd.DataFrame:
+def _fetch_frame(query: str, key: str, key_dtype: pd.CategoricalDtype) -> pd.DataFrame:
     """
-    Charge depuis MySQL les colonnes nécessaires pour le calcul du delta.
-
-    Requête SQL :
-        SELECT participant_id, velocity_id, distance_id, weather_id,
-               perceived_distance - distance_id AS delta
-        FROM perception;
-
-    Colonnes finales :
-    - participant_id
-    - distance_id
-    - velocity_group (calculé)
-    - weather_id
-    - delta (perception - réalité)
-
-    Avantages :
-    - pas de post-calcul en Python pour le delta
-    - format léger → plus rapide pour Streamlit
+    Exécute `query` et retourne le résultat (mean / std en float, NULL → NaN).
+
+    La clé `key` est convertie en catégoriel puis triée (clé, distance) :
+    l'ordre des catégories fixe l'ordre des barres et de la légende.
     """
     if get_db_connection is None:
         raise RuntimeError("db_utils.get_db_connection introuvable/import impossible.")
 
     conn, cursor = get_db_connection()
     try:
-        # Calcul du delta directement en SQL
-        cursor.execute(
-            """
-            SELECT participant_id, velocity_id, distance_id, weather_id,
-                   perceived_distance - distance_id AS delta
-            FROM perception;
-            """
-        )
+        cursor.execute(query)
         cols = [c[0] for c in cursor.description]
         rows = cursor.fetchall()
     finally:
@@ -111,99 +127,100 @@ def load_delta_df() -> pd.DataFrame:
         except Exception:
             pass
 
-    # Construction du DataFrame
-    df = pd.DataFrame(rows, columns=cols).dropna()
-    if df.empty:
-        return df
-
-    # Conversion des vitesses + classification
-    df["velocity_id"] = pd.to_numeric(df["velocity_id"], errors="coerce")
-    df["velocity_ms"] = df["velocity_id"] * (5.0 / 18.0)
-    df["velocity_group"] = df["velocity_id"].apply(categorize_velocity)
-
-    return df
+    df = typed_frame(cols, rows, {
+        key: key_dtype, "distance_id": np.float64, "mean": np.float64, "std": np.float64,
+    })
+    return df.sort_values([key, "distance_id"], ignore_index=True)
 
 
-def build_figures(df: pd.DataFrame):
-    """
-    Construit les deux barplots (par météo et par vitesse).
-
-    Méthode :
-    - On groupe par distance_id pour conserver la structure de l’expérience.
-    - On calcule mean ± std pour chaque distance.
-    - Les couleurs et labels sont harmonisés avec le reste de l’application.
+@st.cache_resource(show_spinner=False, ttl=SNAPSHOT_TTL)
+def load_delta_df() -> Tuple[pd.DataFrame, pd.DataFrame]:
     """
+    Charge depuis MySQL le delta (perceived_distance - distance_id) déjà agrégé.
 
-    # -------------------------
-    # 1) Graphique groupé par météo
-    # -------------------------
-    fig_weather = go.Figure()
+    Deux requêtes GROUP BY (voir DELTA_BY_WEATHER_SQL / DELTA_BY_VELOCITY_SQL) :
+    MySQL calcule moyenne et écart-type, seules quelques dizaines de lignes
+    transitent au lieu de la table entière. Chaque résultat passe par un
+    instantané parquet (load_snapshot) : après un redémarrage, ou dans un
+    autre worker, les requêtes ne sont pas rejouées tant qu'il est récent.
 
-    for weather in df["weather_id"].dropna().unique():
+    Retourne (by_weather, by_velocity) :
+    - by_weather  : weather_id (catégoriel), distance_id, mean, std
+    - by_velocity : velocity_group (catégoriel), distance_id, mean, std
 
-        # Agrégation mean ± std
-        g = (
-            df[df["weather_id"] == weather]
-            .groupby("distance_id")["delta"]
-            .agg(["mean", "std"])
-            .reset_index()
-        )
+    st.cache_resource partage les deux DataFrames entre toutes les sessions
+    (même objet à chaque rerun, ne pas les modifier en place) ; même ttl
+    (SNAPSHOT_TTL) que le chargeur des pages de perception moyenne.
+    """
+    by_weather = load_snapshot(
+        DELTA_BY_WEATHER_SNAPSHOT,
+        lambda: _fetch_frame(DELTA_BY_WEATHER_SQL, "weather_id", WEATHER_DTYPE),
+    )
+    by_velocity = load_snapshot(
+        DELTA_BY_VELOCITY_SNAPSHOT,
+        lambda: _fetch_frame(DELTA_BY_VELOCITY_SQL, "velocity_group", VELOCITY_GROUP_DTYPE),
+    )
+    return by_weather, by_velocity
 
-        # Ajout de la barre
-        fig_weather.add_trace(
-            go.Bar(
-                x=g["distance_id"],
-                y=g["mean"],
-                name=f"{weather.capitalize()} Weather",
-                marker=dict(color=WEATHER_COLOR.get(str(weather), "#7f7f7f")),
-                error_y=dict(type="data", array=g["std"], visible=True),
-            )
-        )
 
-    # Mise en forme
-    fig_weather.update_layout(
+def _bar_layout(title: str) -> dict:
+    """Mise en page commune aux deux barplots (barres groupées par distance)."""
+    return dict(
         barmode="group",
         xaxis=dict(title="Distance of disappearing"),
         yaxis=dict(title="Delta (Perceived - Real)"),
-        title="Mean by Weather",
+        title=title,
         margin=dict(t=60, b=40, l=40, r=20),
         height=460,
         template="plotly_white",
     )
 
-    # -------------------------
-    # 2) Graphique groupé par vitesse
-    # -------------------------
-    fig_velocity = go.Figure()
 
-    for vcat in df["velocity_group"].dropna().unique():
+def build_figures(by_weather: pd.DataFrame, by_velocity: pd.DataFrame):
+    """
+    Construit les deux barplots (par météo et par vitesse).
 
-        g = (
-            df[df["velocity_group"] == vcat]
-            .groupby("distance_id")["delta"]
-            .agg(["mean", "std"])
-            .reset_index()
-        )
+    Méthode :
+    - Les moyennes et écarts-types par distance arrivent déjà agrégés de MySQL.
+    - Une barre (mean ± std) par distance et par météo / groupe de vitesse.
+    - Les couleurs et labels sont harmonisés avec le reste de l’application.
+    """
 
-        fig_velocity.add_trace(
-            go.Bar(
-                x=g["distance_id"],
-                y=g["mean"],
-                name=f"{vcat.capitalize()} Speed",
-                marker=dict(color=VELOCITY_COLOR.get(str(vcat), "#7f7f7f")),
-                error_y=dict(type="data", array=g["std"], visible=True),
-            )
+    # Traces construites en dictionnaires bruts puis passées en une fois au
+    # constructeur de la figure (pas de add_trace / update_layout successifs)
+
+    # -------------------------
+    # 1) Graphique groupé par météo
+    # -------------------------
+    # Un seul découpage par météo (ordre des catégories), pas de masque par météo
+    bars = [
+        dict(
+            type="bar",
+            x=g["distance_id"],
+            y=g["mean"],
+            name=f"{weather.capitalize()} Weather",
+            marker=dict(color=WEATHER_COLOR.get(str(weather), "#7f7f7f")),
+            error_y=dict(type="data", array=g["std"], visible=True),
         )
+        for weather, g in by_weather.groupby("weather_id", observed=True)
+    ]
+    fig_weather = go.Figure(data=bars, layout=_bar_layout("Mean by Weather"))
 
-    fig_velocity.update_layout(
-        barmode="group",
-        xaxis=dict(title="Distance of disappearing"),
-        yaxis=dict(title="Delta (Perceived - Real)"),
-        title="Mean by Velocity",
-        margin=dict(t=60, b=40, l=40, r=20),
-        height=460,
-        template="plotly_white",
-    )
+    # -------------------------
+    # 2) Graphique groupé par vitesse
+    # -------------------------
+    bars = [
+        dict(
+            type="bar",
+            x=g["distance_id"],
+            y=g["mean"],
+            name=f"{vcat.capitalize()} Speed",
+            marker=dict(color=VELOCITY_COLOR.get(str(vcat), "#7f7f7f")),
+            error_y=dict(type="data", array=g["std"], visible=True),
+        )
+        for vcat, g in by_velocity.groupby("velocity_group", observed=True)
+    ]
+    fig_velocity = go.Figure(data=bars, layout=_bar_layout("Mean by Velocity"))
 
     return fig_weather, fig_velocity
 
@@ -219,16 +236,19 @@ def render(base_path: Path) -> None:
     st.subheader("Avg Delta Perception By Weather and Velocity")
 
     try:
-        df = load_delta_df()
+        delta = load_delta_df()
     except Exception as e:
         st.error(f"Erreur de chargement MySQL : {e}")
         return
 
-    if df.empty:
+    by_weather, by_velocity = delta
+    if by_weather.empty:
         st.info("Aucune donnée trouvée dans la table Perception.")
         return
 
-    fig_w, fig_v = build_figures(df)
+    # Figures reconstruites seulement quand load_delta_df() renvoie un
+    # nouveau couple (cache partagé expiré)
+    fig_w, fig_v = cached_figure((__name__,), delta, lambda: build_figures(by_weather, by_velocity))
 
     st.plotly_chart(fig_w, use_container_width=True)
     st.plotly_chart(fig_v, use_container_width=True)
@@ -29,11 +29,11 @@ import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import streamlit as st
 
-# Import flexible, utile sur Streamlit Cloud
-try:
-    from db_utils import get_db_connection
-except Exception:
-    get_db_connection = None
+# Chargement partagé de la table crossing (un seul cache pour les pages crossing)
+from ._crossing_loaders import load_crossing_avg_by_participant
+
+# Figures conservées dans la session (cache LRU commun aux pages)
+from ._figure_cache import cached_figure
 
 # Groupes de vitesse possibles (exactement comme dans la base VR)
 VELOCITY_GROUPS: Dict[str, Tuple[float, float]] = {
@@ -42,6 +42,11 @@ VELOCITY_GROUPS: Dict[str, Tuple[float, float]] = {
     "high": (60.0, 70.0),
 }
 
+# Table vitesse exacte → groupe (lookup vectorisé via Series.map)
+VELOCITY_LOOKUP: Dict[float, str] = {
+    v: cat for cat, pair in VELOCITY_GROUPS.items() for v in pair
+}
+
 # Couleurs associées aux groupes de vitesses
 COLOR_MAP = {"low": "#1f77b4", "medium": "#2ca02c", "high": "#d62728"}
 
@@ -51,82 +56,46 @@ Y_OFFSET = {"low": 0.0, "medium": 0.01, "high": 0.02}
 # Ordre fixe des 3 conditions météo
 WEATHERS: List[str] = ["clear", "rain", "night"]
 
+# Colonne du subplot associée à chaque météo
+WEATHER_COL: Dict[str, int] = {w: i + 1 for i, w in enumerate(WEATHERS)}
 
-def get_velocity_category(velocity_id: float) -> str:
-    """
-    Retourne la catégorie ('low', 'medium', 'high') correspondant à la vitesse.
-    La valeur velocity_id contient des vitesses exactes (20/30/40/50/60/70).
-    """
-    for cat, pair in VELOCITY_GROUPS.items():
-        if velocity_id in pair:
-            return cat
-    return "unknown"
+# Distances simulées pour la courbe seuil (communes à toutes les courbes)
+XS = np.arange(-150, 6, dtype=np.int32)
 
 
-def calculate_crossing_value(distance: float, safety_distance: float) -> int:
+def get_velocity_category(velocity_id: pd.Series) -> pd.Series:
     """
-    Fonction core de la “courbe seuil”.
-
-    Règle utilisée dans tous les scripts de crossing :
-        crossing = 1 si distance < -safety_distance
-        crossing = 0 sinon
-
-    → distance est signée dans le modèle VR (négatif = véhicule proche).
+    Retourne la catégorie ('low', 'medium', 'high') correspondant à chaque vitesse.
+    La colonne velocity_id contient des vitesses exactes (20/30/40/50/60/70) ;
+    toute autre valeur donne 'unknown'.
     """
-    return 0 if distance >= -float(safety_distance) else 1
-
+    return velocity_id.astype(float).map(VELOCITY_LOOKUP).fillna("unknown")
 
-@st.cache_data(show_spinner=False)
-def load_crossing_avg() -> pd.DataFrame:
-    """
-    Charge la table 'crossing' et calcule la moyenne & écart-type
-    de la safety_distance par :
-        (participant_id, weather_id, velocity_id)
 
-    Cela permet d’obtenir :
-        - un safety_distance moyen pour chaque config
-        - un écart-type qui sera affiché en barre d’erreur
-    """
-    if get_db_connection is None:
-        raise RuntimeError("db_utils.get_db_connection introuvable/import impossible.")
-
-    conn, cursor = get_db_connection()
-    try:
-        cursor.execute(
-            "SELECT participant_id, weather_id, position_id, velocity_id, safety_distance FROM crossing;"
-        )
-        cols = [c[0] for c in cursor.description]
-        rows = cursor.fetchall()
-    finally:
-        try: cursor.close()
-        except Exception: pass
-        try: conn.close()
-        except Exception: pass
-
-    df = pd.DataFrame(rows, columns=cols).dropna()
-    if df.empty:
-        return df
-
-    # Agrégation par combinaison [participant, météo, vitesse]
-    avg = (
-        df.groupby(["participant_id", "weather_id", "velocity_id"])  # type: ignore
-        ["safety_distance"]
-        .agg(["mean", "std"])
-        .reset_index()
-    )
-    return avg
-
-
-def build_figure(avg_df: pd.DataFrame, participant_id) -> go.Figure:
+def build_figure(data: pd.DataFrame) -> go.Figure:
     """
     Construit la figure à 3 colonnes (Clear, Rain, Night)
     avec pour chaque météo :
         - une courbe threshold pour chaque vitesse
         - un marqueur indiquant mean ± std de la safety_distance
+
+    `data` : moyennes du participant sélectionné, météos attendues
+    uniquement, triées météo puis vitesse (voir
+    load_crossing_avg_by_participant) ; une ligne = une courbe, la moyenne
+    étant unique par participant × météo × vitesse.
     """
 
-    # Sous-ensemble : données du participant sélectionné
-    data = avg_df[avg_df["participant_id"] == participant_id]
+    # Catégorie de vitesse, moyenne & std de la safety_distance (std NaN → 0)
+    vcats = get_velocity_category(data["velocity_id"]).tolist()
+    means = data["mean"].to_numpy(dtype=float)
+    stds = np.nan_to_num(data["std"].to_numpy(dtype=float))
+    yofs = np.array([Y_OFFSET.get(vcat, 0.0) for vcat in vcats])
+
+    # Toutes les courbes crossing(threshold) en une opération, une ligne par courbe :
+    #   crossing = 1 si distance < -safety_distance, 0 sinon
+    # (distance signée dans le modèle VR : négatif = véhicule proche)
+    # + décalage vertical pour éviter overlap
+    curves = np.where(XS >= -means[:, None], 0.0, 1.0) + yofs[:, None]
 
     # 3 sous-graphes côte-à-côte
     fig = make_subplots(
@@ -136,67 +105,45 @@ def build_figure(avg_df: pd.DataFrame, participant_id) -> go.Figure:
         shared_yaxes=True,
     )
 
-    # Boucle météo → colonne du subplot
-    for weather_id, weather_data in data.groupby("weather_id"):
-
-        if weather_id not in WEATHERS:
-            # Ignore toute météo inattendue
-            continue
-
-        col_index = {"clear": 1, "rain": 2, "night": 3}[str(weather_id)]
-
-        # Boucle sur les différentes vitesses
-        for velocity_id, vdf in weather_data.groupby("velocity_id"):
-
-            # Catégorie de vitesse
-            vcat = get_velocity_category(float(velocity_id))
-
-            # Moyenne & std de la safety_distance
-            m = float(vdf["mean"].values[0])
-            std_val = vdf["std"].values[0]
-            s = float(std_val) if pd.notna(std_val) else 0.0
-
-            # Génération de la courbe crossing(threshold)
-            xs = list(range(-150, 6))  # distances simulées
-            ys = [calculate_crossing_value(d, m) for d in xs]
-
-            # Décalage vertical pour éviter overlap
-            yofs = Y_OFFSET.get(vcat, 0.0)
-            ys = [y + yofs for y in ys]
-
-            # Couleur de ce groupe de vitesse
-            color = COLOR_MAP.get(vcat, "#000000")
-
-            # ---- Courbe crossing ----
-            fig.add_trace(
-                go.Scatter(
-                    x=xs,
-                    y=ys,
-                    mode="lines",
-                    name=f"{vcat.capitalize()} Speed",
-                    line=dict(color=color, width=1),
-                    legendgroup=vcat,
-                    showlegend=(weather_id == "clear"),  # éviter répétitions
-                ),
-                row=1,
-                col=col_index,
-            )
-
-            # ---- Marqueur Mean ± Std ----
-            fig.add_trace(
-                go.Scatter(
-                    x=[-m],  # -m car sign convention VR
-                    y=[0.5 + yofs],
-                    mode="markers",
-                    marker=dict(size=5, color=color, symbol="x"),
-                    name=f"{vcat.capitalize()} Mean",
-                    legendgroup=vcat,
-                    error_x=dict(type="data", symmetric=True, array=[s], visible=True),
-                    showlegend=False,
-                ),
-                row=1,
-                col=col_index,
-            )
+    # Une courbe + un marqueur par (météo, vitesse) ; météo → colonne du subplot
+    for i, weather_id in enumerate(data["weather_id"].astype(str)):
+        col_index = WEATHER_COL[weather_id]
+        vcat = vcats[i]
+        m = means[i]
+
+        # Couleur de ce groupe de vitesse
+        color = COLOR_MAP.get(vcat, "#000000")
+
+        # ---- Courbe crossing ----
+        fig.add_trace(
+            go.Scatter(
+                x=XS,
+                y=curves[i],
+                mode="lines",
+                name=f"{vcat.capitalize()} Speed",
+                line=dict(color=color, width=1),
+                legendgroup=vcat,
+                showlegend=(weather_id == "clear"),  # éviter répétitions
+            ),
+            row=1,
+            col=col_index,
+        )
+
+        # ---- Marqueur Mean ± Std ----
+        fig.add_trace(
+            go.Scatter(
+                x=[-m],  # -m car sign convention VR
+                y=[0.5 + yofs[i]],
+                mode="markers",
+                marker=dict(size=5, color=color, symbol="x"),
+                name=f"{vcat.capitalize()} Mean",
+                legendgroup=vcat,
+                error_x=dict(type="data", symmetric=True, array=[stds[i]], visible=True),
+                showlegend=False,
+            ),
+            row=1,
+            col=col_index,
+        )
 
     # ---- Mise en forme globale ----
     fig.update_layout(
@@ -221,28 +168,29 @@ def render(base_path: Path) -> None:
 
     st.subheader("Crossing Value vs Distance (V,W) – par participant")
 
-    # Chargement base MySQL
+    # Chargement base MySQL, déjà découpé par participant
     try:
-        avg = load_crossing_avg()
+        by_participant = load_crossing_avg_by_participant()
     except Exception as e:
         st.error(f"Erreur de chargement MySQL : {e}")
         return
 
-    if avg.empty:
+    if not by_participant:
         st.info("Aucune donnée trouvée dans la table Crossing.")
         return
 
-    # Liste dynamique des participants
-    participants = sorted(avg["participant_id"].unique())
-    default_idx = 0 if participants else None
+    # Liste des participants (clés déjà triées)
+    participants = list(by_participant)
 
     # Sélecteur dans la barre latérale
-    pid = st.selectbox("Participant", participants, index=default_idx)
+    pid = st.selectbox("Participant", participants, index=0)
 
     if pid is None:
         st.info("Aucun participant à afficher.")
         return
 
-    # Construction & affichage
-    fig = build_figure(avg, pid)
+    # Une figure par participant déjà affiché, reconstruite seulement quand
+    # load_crossing_avg_by_participant() renvoie un nouvel objet
+    fig = cached_figure((__name__, pid), by_participant,
+                        lambda: build_figure(by_participant[pid]))
     st.plotly_chart(fig, use_container_width=True)
@@ -29,11 +29,11 @@ import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import streamlit as st
 
-# Import flexible pour Streamlit Cloud
-try:
-    from db_utils import get_db_connection
-except Exception:
-    get_db_connection = None
+# Chargement partagé de la table perception (un seul cache pour les pages de perception)
+from ._perception_loader import list_participants, load_participant_perception
+
+# Figures conservées dans la session (cache LRU commun aux pages)
+from ._figure_cache import cached_figure
 
 # Couleurs en fonction de la vitesse
 COLOR_MAP: Dict[float, str] = {
@@ -46,55 +46,6 @@ COLOR_MAP: Dict[float, str] = {
 SYMBOL_MAP = {"clear": "circle", "rain": "square", "night": "diamond"}
 
 
-@st.cache_data(show_spinner=False)
-def load_perception_df() -> pd.DataFrame:
-    """
-    Charge la table MySQL 'perception' et prépare les colonnes nécessaires.
-
-    Ajouts :
-    - `velocity_ms` : conversion km/h → m/s
-    - `real_time`   : distance réelle / vitesse
-    - `perceived_time` : distance perçue / vitesse
-    - Tri par vitesse → météo → distance (cohérence avec version Dash)
-
-    Le cache empêche Streamlit de recharger la base à chaque interaction.
-    """
-
-    if get_db_connection is None:
-        raise RuntimeError("db_utils.get_db_connection introuvable/import impossible.")
-
-    conn, cursor = get_db_connection()
-    try:
-        cursor.execute("SELECT * FROM perception;")
-        cols = [c[0] for c in cursor.description]
-        rows = cursor.fetchall()
-    finally:
-        # Fermeture propre
-        try: cursor.close()
-        except Exception: pass
-        try: conn.close()
-        except Exception: pass
-
-    df = pd.DataFrame(rows, columns=cols).dropna()
-    if df.empty:
-        return df
-
-    # Tri comme la version Matplotlib/Dash originale
-    df = df.sort_values(by=["velocity_id", "weather_id", "distance_id"])
-
-    # Conversion & colonnes dérivées
-    df["velocity_id"] = pd.to_numeric(df["velocity_id"], errors="coerce")
-    df["velocity_ms"] = df["velocity_id"] * (5.0 / 18.0)
-
-    # Éviter division par zéro
-    df = df[df["velocity_ms"].replace(0, np.nan).notna()].copy()
-
-    df["real_time"] = df["distance_id"] / df["velocity_ms"]
-    df["perceived_time"] = df["perceived_distance"] / df["velocity_ms"]
-
-    return df
-
-
 def build_figure(df_part: pd.DataFrame, selected_participant) -> go.Figure:
     """
     Construit les deux sous-graphiques :
@@ -106,56 +57,83 @@ def build_figure(df_part: pd.DataFrame, selected_participant) -> go.Figure:
         • couleur = vitesse
         • symbole = météo
         • markers + line pour suivre les points par ordre croissant
+
+    Les courbes de même couleur et même symbole (vitesses 20/30, 40/50,
+    60/70 d'une même météo) sont regroupées dans une seule trace WebGL
+    (go.Scattergl) par sous-graphique, séparées par des NaN : une entrée de
+    légende par couleur × météo, qui masque ses courbes dans les deux
+    sous-graphiques. La vitesse exacte de chaque point reste visible au
+    survol. Les deux droites y=x (2 points chacune) restent en SVG.
     """
 
     fig = make_subplots(rows=1, cols=2, shared_xaxes=False, vertical_spacing=0.1)
 
-    # Boucles sur toutes les combinaisons utilisées par ce participant
-    for velocity in df_part["velocity_id"].unique():
-        for weather in df_part["weather_id"].unique():
-
-            # Sous-ensemble V×W
-            g = df_part[(df_part["velocity_id"] == velocity) &
-                        (df_part["weather_id"] == weather)]
-            if g.empty:
-                continue
-
-            color = COLOR_MAP.get(float(velocity), "#444")
-            symbol = SYMBOL_MAP.get(str(weather), "circle")
-
-            # --- Graphique Distance ---
-            fig.add_trace(
-                go.Scatter(
-                    x=g["distance_id"],
-                    y=g["perceived_distance"],
-                    mode="markers+lines",
-                    name=f"{velocity:.0f} km/h - {weather}",
-                    marker=dict(symbol=symbol, color=color, size=8),
-                    line=dict(color=color, width=2),
-                    legendgroup=f"{velocity}-{weather}",
-                ),
-                row=1, col=1,
-            )
-
-            # --- Graphique Temps ---
-            fig.add_trace(
-                go.Scatter(
-                    x=g["real_time"],
-                    y=g["perceived_time"],
-                    mode="markers+lines",
-                    name=f"{velocity:.0f} km/h - {weather}",
-                    marker=dict(symbol=symbol, color=color, size=8),
-                    line=dict(color=color, width=2),
-                    legendgroup=f"{velocity}-{weather}",
-                    showlegend=False,   # éviter doublon dans légende
-                ),
-                row=1, col=2,
-            )
-
-    # Lignes de référence y=x (perception parfaite)
+    # df_part est trié vitesse → météo → distance : chaque combinaison V×W
+    # forme un bloc de lignes contiguës. Un NaN inséré après chaque bloc
+    # coupe la ligne, ce qui permet de tracer toutes les combinaisons d'une
+    # même couleur et d'une même météo dans une seule trace.
+    velocity = df_part["velocity_id"].to_numpy(dtype=np.float64)
+    weather = df_part["weather_id"].astype(str).to_numpy()
+    block_end = np.r_[(velocity[1:] != velocity[:-1]) | (weather[1:] != weather[:-1]), True]
+    ends = np.flatnonzero(block_end) + 1
+
+    def with_breaks(values) -> np.ndarray:
+        """Valeurs par ligne + un NaN après chaque bloc V×W."""
+        return np.insert(np.asarray(values, dtype=np.float64), ends, np.nan)
+
+    # Attributs par bloc V×W (une vitesse et une météo chacun), répétés sur
+    # les lignes du bloc et le NaN qui le termine : couleur (vitesse),
+    # symbole (météo), libellé V×W
+    starts = np.r_[0, ends[:-1]]
+    block_v, block_w = velocity[starts], weather[starts]
+    reps = np.diff(np.r_[0, ends]) + 1
+
+    def per_point(block_values) -> np.ndarray:
+        """Attribut de chaque bloc, répété sur tous ses points."""
+        return np.repeat(np.asarray(block_values), reps)
+
+    block_color = np.array([COLOR_MAP.get(v, "#444") for v in block_v])
+    colors, weathers = per_point(block_color), per_point(block_w)
+    labels = per_point([f"{v:.0f} km/h - {w}" for v, w in zip(block_v, block_w)])
+    speeds = per_point(block_v)
+
+    x_dist, y_dist = with_breaks(df_part["distance_id"]), with_breaks(df_part["perceived_distance"])
+    x_time, y_time = with_breaks(df_part["real_time"]), with_breaks(df_part["perceived_time"])
+
+    # Une trace par (couleur, météo) et par sous-graphique, dans l'ordre des
+    # blocs (vitesse → météo)
+    pairs = list(dict.fromkeys(zip(block_color.tolist(), block_w.tolist())))
+    for color, w in pairs:
+        m = (colors == color) & (weathers == w)
+        name = "/".join(f"{v:.0f}" for v in np.unique(speeds[m])) + f" km/h - {w}"
+        style = dict(
+            mode="markers+lines",
+            name=name,
+            marker=dict(symbol=SYMBOL_MAP.get(w, "circle"), color=color, size=8),
+            line=dict(color=color, width=2),
+            # Même groupe dans les deux sous-graphiques : un clic sur
+            # l'entrée de légende masque les deux courbes
+            legendgroup=name,
+            # Vitesse et météo de chaque point au survol
+            hovertext=labels[m],
+        )
+
+        # --- Graphique Distance ---
+        fig.add_trace(go.Scattergl(x=x_dist[m], y=y_dist[m], **style), row=1, col=1)
+
+        # --- Graphique Temps ---
+        fig.add_trace(
+            go.Scattergl(x=x_time[m], y=y_time[m], showlegend=False, **style),  # éviter doublon dans légende
+            row=1, col=2,
+        )
+
+    # Lignes de référence y=x (perception parfaite), bornes des deux axes X
+    # en une seule réduction sur (distance réelle, temps réel)
     if not df_part.empty:
+        bounds = df_part[["distance_id", "real_time"]].to_numpy(dtype=np.float64)
+        (x1_min, x2_min), (x1_max, x2_max) = bounds.min(axis=0).tolist(), bounds.max(axis=0).tolist()
+
         # Plot 1 : distance
-        x1_min, x1_max = float(df_part["distance_id"].min()), float(df_part["distance_id"].max())
         fig.add_trace(
             go.Scatter(
                 x=[x1_min, x1_max], y=[x1_min, x1_max],
@@ -166,7 +144,6 @@ def build_figure(df_part: pd.DataFrame, selected_participant) -> go.Figure:
         )
 
         # Plot 2 : temps
-        x2_min, x2_max = float(df_part["real_time"].min()), float(df_part["real_time"].max())
         fig.add_trace(
             go.Scatter(
                 x=[x2_min, x2_max], y=[x2_min, x2_max],
@@ -194,30 +171,38 @@ def build_figure(df_part: pd.DataFrame, selected_participant) -> go.Figure:
 def render(base_path: Path) -> None:
     """
     Fonction Streamlit :
-    - charge toutes les données de perception
-    - sélectionne un participant
+    - liste les participants (requête légère)
+    - sélectionne un participant et charge uniquement ses données
     - affiche les 2 sous-graphiques
     """
     st.subheader("Perceived Distance by Velocity × Weather – par participant")
 
-    # Chargement des données MySQL
+    # Liste des participants
     try:
-        df = load_perception_df()
+        participants = list_participants()
     except Exception as e:
         st.error(f"Erreur de chargement MySQL : {e}")
         return
 
-    if df.empty:
+    if not participants:
         st.info("Aucune donnée trouvée dans la table Perception.")
         return
 
-    # Liste des participants
-    participants = sorted(df["participant_id"].unique())
     pid = st.selectbox("Participant", participants, index=0)
 
-    # Sous-ensemble uniquement pour ce participant
-    df_part = df[df["participant_id"] == pid]
+    # Données de ce participant seulement (déjà triées par le chargeur)
+    try:
+        df_part = load_participant_perception(pid)
+    except Exception as e:
+        st.error(f"Erreur de chargement MySQL : {e}")
+        return
+
+    if df_part.empty:
+        st.info("Aucune mesure exploitable pour ce participant.")
+        return
 
-    # Construction & affichage de la figure
-    fig = build_figure(df_part, pid)
+    # Une figure par participant déjà affiché, reconstruite seulement quand
+    # load_participant_perception(pid) renvoie un nouvel objet
+    fig = cached_figure((__name__, pid), df_part,
+                        lambda: build_figure(df_part, pid))
     st.plotly_chart(fig, use_container_width=True)
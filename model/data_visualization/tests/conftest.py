@@ -0,0 +1,69 @@
+"""
+Outils communs aux tests de l'application Streamlit.
+
+Les pages (features/) sont importées comme par app.py, depuis le dossier
+model/data_visualization. MySQL est remplacé par un faux curseur qui
+enregistre les requêtes exécutées et renvoie des lignes préparées.
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+# Dossier de app.py : `features` et `db_utils` s'importent comme dans l'application
+APP_DIR = Path(__file__).resolve().parents[1]
+if str(APP_DIR) not in sys.path:
+    sys.path.insert(0, str(APP_DIR))
+
+
+class FakeCursor:
+    """
+    Curseur MySQL minimal (connexion et curseur à la fois).
+
+    `respond(query, params)` retourne (colonnes, lignes) pour chaque requête ;
+    toutes les requêtes exécutées sont ajoutées à `queries`.
+    """
+
+    def __init__(self, respond, queries):
+        self.respond = respond
+        self.queries = queries
+        self.description = []
+        self.rows = []
+
+    def execute(self, query, params=None):
+        self.queries.append(query)
+        cols, self.rows = self.respond(query, params)
+        self.description = [(c,) for c in cols]
+
+    def fetchall(self):
+        return list(self.rows)
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    """
+    Remplace get_db_connection d'un module par un faux curseur.
+
+    Usage : queries = fake_db(module, respond) ; sans pyarrow forcé,
+    load_snapshot interroge toujours le faux curseur (aucun instantané lu).
+    """
+    from features import _perception_loader
+
+    monkeypatch.setattr(_perception_loader, "HAS_PYARROW", False)
+
+    def install(module, respond):
+        queries = []
+        monkeypatch.setattr(
+            module, "get_db_connection",
+            lambda *a, **k: (FakeCursor(respond, queries), FakeCursor(respond, queries)),
+        )
+        return queries
+
+    return install
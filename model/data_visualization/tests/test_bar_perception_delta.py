@@ -0,0 +1,94 @@
+"""
+Page bar_perception_delta : deltas agrégés par MySQL, une barre par
+catégorie.
+"""
+
+import inspect
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Dépendances de l'application : module ignoré si elles manquent
+pytest.importorskip("streamlit")
+pytest.importorskip("plotly")
+
+from features import bar_perception_delta as delta
+
+DISTANCES = (10.0, 20.0, 30.0, 40.0)
+WEATHERS = ("night", "clear", "rain")
+GROUPS = ("high", "low", "medium")
+
+
+def respond(query, params):
+    """Résultat GROUP BY de chaque requête, catégories dans le désordre."""
+    key, values = ("weather_id", WEATHERS) if "weather_id, distance_id" in query else ("velocity_group", GROUPS)
+    rows = [(k, d, d / 10 + i, 0.5 + i) for i, k in enumerate(values) for d in DISTANCES]
+    return [key, "distance_id", "mean", "std"], rows
+
+
+def test_load_delta_df_aggregates_in_sql(fake_db, monkeypatch):
+    # Deux requêtes GROUP BY (moyenne / écart-type calculés par MySQL),
+    # aucun groupby pandas pendant le chargement
+    queries = fake_db(delta, respond)
+
+    def no_groupby(*args, **kwargs):
+        raise AssertionError("groupby pandas pendant load_delta_df")
+
+    monkeypatch.setattr(pd.DataFrame, "groupby", no_groupby)
+    by_weather, by_velocity = inspect.unwrap(delta.load_delta_df)()
+
+    assert queries == [delta.DELTA_BY_WEATHER_SQL, delta.DELTA_BY_VELOCITY_SQL]
+    for query in queries:
+        assert "GROUP BY" in query
+        assert "AVG(" in query and "STDDEV_SAMP(" in query
+
+    assert len(by_weather) == len(WEATHERS) * len(DISTANCES)
+    assert len(by_velocity) == len(GROUPS) * len(DISTANCES)
+    assert list(by_weather.columns) == ["weather_id", "distance_id", "mean", "std"]
+    assert np.isfinite(by_velocity["std"].to_numpy()).all()
+
+
+@pytest.fixture
+def frames(fake_db):
+    """(by_weather, by_velocity) lus depuis le faux curseur."""
+    fake_db(delta, respond)
+    return inspect.unwrap(delta.load_delta_df)()
+
+
+def test_one_bar_trace_per_category(frames):
+    # Une trace par météo / groupe de vitesse, dans l'ordre des catégories,
+    # chacune avec toutes les distances et son écart-type en error_y
+    fig_weather, fig_velocity = delta.build_figures(*frames)
+
+    assert [t.name for t in fig_weather.data] == ["Clear Weather", "Rain Weather", "Night Weather"]
+    assert [t.name for t in fig_velocity.data] == ["Low Speed", "Medium Speed", "High Speed"]
+
+    # Valeurs de respond() : moyenne d / 10 + i et écart-type 0.5 + i,
+    # i = rang de la catégorie dans le résultat SQL
+    for fig, values, order in (
+        (fig_weather, WEATHERS, ("clear", "rain", "night")),
+        (fig_velocity, GROUPS, ("low", "medium", "high")),
+    ):
+        for t, key in zip(fig.data, order):
+            i = values.index(key)
+            assert t.type == "bar"
+            np.testing.assert_array_equal(t.x, DISTANCES)
+            np.testing.assert_allclose(t.y, np.array(DISTANCES) / 10 + i)
+            np.testing.assert_allclose(t.error_y.array, np.full(len(DISTANCES), 0.5 + i))
+
+
+def test_figures_split_each_frame_in_one_pass(frames, monkeypatch):
+    # Un seul groupby par agrégat (météo, vitesse) : pas de filtre ni de
+    # réagrégation par catégorie
+    calls = []
+    groupby = pd.DataFrame.groupby
+
+    def counting_groupby(self, by=None, *args, **kwargs):
+        calls.append(by)
+        return groupby(self, by, *args, **kwargs)
+
+    monkeypatch.setattr(pd.DataFrame, "groupby", counting_groupby)
+    delta.build_figures(*frames)
+
+    assert calls == ["weather_id", "velocity_group"]
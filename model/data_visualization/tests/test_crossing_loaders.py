@@ -0,0 +1,78 @@
+"""
+Chargement des séries crossing(distance) d'un participant
+(_crossing_loaders.load_participant_series).
+"""
+
+import inspect
+
+import numpy as np
+import pytest
+
+# Dépendances de l'application : module ignoré si elles manquent
+pytest.importorskip("streamlit")
+pytest.importorskip("plotly")
+
+from features import _crossing_loaders as CL
+
+DIST = b"[-12.5, -8.0, -3.25, 0.5]"
+CROSS = b"[0, 1, 1, 0]"
+
+# weather_id, position_id, velocity_id, distance_car_ped, crossing_value, crossing_id
+ROWS = [
+    ("clear", 0, 20.0, DIST, CROSS, 1),
+    ("clear", 1, 20.0, DIST, CROSS, 2),
+    ("clear", 1, 50.0, b"[4.0, 2.0, 1.0]", b"[1, 1, 0, 0]", 3),
+    ("rain", 2, 70.0, DIST, CROSS, 4),
+]
+
+
+@pytest.fixture
+def series(fake_db):
+    """Séries du participant P01 lues depuis ROWS (hors cache Streamlit)."""
+    cols = ["weather_id", "position_id", "velocity_id", "distance_car_ped", "crossing_value", "crossing_id"]
+    queries = fake_db(CL, lambda q, p: (cols, ROWS))
+    data = inspect.unwrap(CL.load_participant_series)("P01")
+    assert len(queries) == 1 and "WHERE participant_id = %s" in queries[0]
+    return data
+
+
+def trial(cell, i, key="distance"):
+    """Série `key` de l'essai i d'une cellule (bornes lues dans offsets)."""
+    offsets = cell["offsets"]
+    return cell[key][offsets[i]:offsets[i + 1]]
+
+
+def test_position_1_distances_are_negated(series):
+    # Même JSON en position 0 et 1 : seule la position 1 change de signe,
+    # sans modifier le tableau décodé partagé entre les deux essais
+    expected = np.array([-12.5, -8.0, -3.25, 0.5], dtype=np.float32)
+    np.testing.assert_array_equal(trial(series["clear"][0], 0), expected)
+    np.testing.assert_array_equal(trial(series["clear"][1], 0), -expected)
+    np.testing.assert_array_equal(trial(series["rain"][2], 0), expected)
+
+
+def test_series_are_float32_arrays(series):
+    # Séries décodées directement en tableaux NumPy float32 (aucune liste
+    # Python), troncature à la longueur commune des deux JSON
+    for cells in series.values():
+        for cell in cells.values():
+            for key in ("distance", "crossing", "velocity_id"):
+                assert isinstance(cell[key], np.ndarray)
+                assert cell[key].dtype == np.float32
+
+    cell = series["clear"][1]
+    np.testing.assert_array_equal(trial(cell, 1), [-4.0, -2.0, -1.0])  # position 1
+    np.testing.assert_array_equal(trial(cell, 1, "crossing"), [1.0, 1.0, 0.0])
+
+
+def test_cells_are_packed_with_offsets(series):
+    # Une cellule par (météo, position), essais mis bout à bout : l'essai i
+    # occupe [offsets[i], offsets[i + 1]) dans distance et crossing
+    assert {w: sorted(cells) for w, cells in series.items()} == {"clear": [0, 1], "rain": [2]}
+
+    cell = series["clear"][1]
+    np.testing.assert_array_equal(cell["offsets"], [0, 4, 7])
+    np.testing.assert_array_equal(cell["velocity_id"], [20.0, 50.0])
+    np.testing.assert_array_equal(cell["crossing_id"], [2, 3])
+    assert cell["distance"].size == cell["crossing"].size == cell["offsets"][-1]
+    np.testing.assert_array_equal(trial(cell, 0, "crossing"), [0.0, 1.0, 1.0, 0.0])
@@ -0,0 +1,45 @@
+"""
+Page participant_crossing_vs_distance_vwp : une trace par groupe de
+vitesse et par cellule météo × position.
+"""
+
+import numpy as np
+import pytest
+
+# Dépendances de l'application : module ignoré si elles manquent
+pytest.importorskip("streamlit")
+pytest.importorskip("plotly")
+
+from features import _crossing_loaders as CL
+from features import participant_crossing_vs_distance_vwp as vwp
+
+
+def cell(trials):
+    """Cellule (météo, position) au format de load_participant_series."""
+    return CL._pack_cell([
+        (v, i, np.asarray(d, dtype=np.float32), np.asarray(c, dtype=np.float32))
+        for i, (v, d, c) in enumerate(trials)
+    ])
+
+
+def test_y_offset_applied_per_speed_group():
+    # Deux essais "low" (20 et 30 km/h), un "medium", un "high" : chaque
+    # trace reçoit le décalage de son groupe sur tous ses points
+    trials = [
+        (20.0, [-9.0, -5.0, -1.0], [0.0, 1.0, 1.0]),
+        (50.0, [-8.0, -4.0], [1.0, 0.0]),
+        (30.0, [-7.0, -3.0], [0.0, 0.0]),
+        (70.0, [-6.0, -2.0, 2.0], [1.0, 1.0, 0.0]),
+    ]
+    fig = vwp.build_figure({"clear": {0: cell(trials)}})
+
+    assert [t.name for t in fig.data] == ["Low Speed", "Medium Speed", "High Speed"]
+    expected = {
+        "Low Speed": ([0.0, 1.0, 1.0, 0.0, 0.0], vwp.Y_OFFSET["low"]),
+        "Medium Speed": ([1.0, 0.0], vwp.Y_OFFSET["medium"]),
+        "High Speed": ([1.0, 1.0, 0.0], vwp.Y_OFFSET["high"]),
+    }
+    for t in fig.data:
+        crossing, offset = expected[t.name]
+        y = np.asarray(t.y, dtype=float)
+        np.testing.assert_allclose(y[~np.isnan(y)], np.array(crossing) + offset, rtol=1e-6)
@@ -0,0 +1,86 @@
+"""
+Pages de perception moyenne : figures construites à partir des
+statistiques agrégées par MySQL (load_perception_df).
+"""
+
+import inspect
+
+import numpy as np
+import pytest
+
+# Dépendances de l'application : module ignoré si elles manquent
+pytest.importorskip("streamlit")
+pytest.importorskip("plotly")
+
+from features import _perception_loader as PL
+from features import avg_perc_dist_by_velocity_err_weather as by_velocity
+from features import avg_perc_dist_by_weather_err_velocity as by_weather
+
+VELOCITIES = (20.0, 30.0, 40.0, 50.0, 60.0, 70.0)
+DISTANCES = (10.0, 20.0, 30.0, 40.0, 50.0)
+
+
+def stats_rows(n):
+    """Une ligne par cellule vitesse × météo × distance, `n` mesures chacune."""
+    rows = []
+    for i, v in enumerate(VELOCITIES):
+        for j, w in enumerate(PL.WEATHER_ORDER):
+            for d in DISTANCES:
+                rows.append((v, w, d, n, d + i - j, 4.0 * (n - 1)))
+    return rows
+
+
+def load_stats(fake_db, n):
+    """load_perception_df() (hors cache Streamlit) sur des cellules de `n` mesures."""
+    cols = list(PL.PERCEPTION_STATS_DTYPES)
+    queries = fake_db(PL, lambda q, p: (cols, stats_rows(n)))
+    df = inspect.unwrap(PL.load_perception_df)()
+    return df, queries
+
+
+def build(page, df):
+    """Figure d'une page à partir des statistiques par cellule."""
+    if page is by_weather:
+        return page.build_figure(page.summarize(df))
+    return page.build_figure(df)
+
+
+def figure_points(fig):
+    """Nombre total de points tracés, toutes traces confondues."""
+    return sum(len(t.x) for t in fig.data)
+
+
+@pytest.mark.parametrize("page", [by_velocity, by_weather])
+def test_figures_plot_aggregates_not_rows(fake_db, page):
+    # Une seule requête GROUP BY, et autant de points pour 1 ou 100 000
+    # mesures par cellule : la figure ne dépend que du nombre de cellules
+    df_small, queries = load_stats(fake_db, 1)
+    df_large, _ = load_stats(fake_db, 100_000)
+
+    assert queries == [PL.PERCEPTION_STATS_SQL]
+    assert "GROUP BY" in PL.PERCEPTION_STATS_SQL
+
+    small, large = build(page, df_small), build(page, df_large)
+    n_cells = len(VELOCITIES) * len(PL.WEATHER_ORDER) * len(DISTANCES)
+    assert figure_points(small) == figure_points(large)
+    assert figure_points(large) <= 4 * n_cells
+    assert np.isfinite(np.asarray(large.data[0].y, dtype=float)).all()
+
+
+@pytest.mark.parametrize("page, labels", [
+    (by_velocity, {w.capitalize() for w in PL.WEATHER_ORDER}),
+    (by_weather, {"Low", "Medium", "High"}),
+])
+def test_error_bar_customdata_varies_per_point(fake_db, page, labels):
+    # Chaque trace de barres d'erreur regroupe plusieurs météos (ou vitesses) :
+    # le libellé du survol est une donnée par point, pas une constante
+    df, _ = load_stats(fake_db, 10)
+    fig = build(page, df)
+
+    traces = [t for t in fig.data if t.customdata is not None]
+    assert traces
+    for t in traces:
+        assert "%{customdata}" in t.hovertemplate
+        assert len(t.customdata) == len(t.x)
+        assert len(set(t.customdata)) > 1
+    assert {str(c) for t in traces for c in t.customdata} == labels